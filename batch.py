@@ -0,0 +1,222 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Any, Callable
+from benchmark import shipped_levels
+from levels import ENEMY_AI_MODES, ENEMY_FIRE_MODES, CompiledLevel, compile_level
+from simulation import Simulation, EnemyTank, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, INPUT_SHOOT, INPUT_RESPAWN
+
+DIRECTION_INPUTS = {'left': INPUT_LEFT, 'right': INPUT_RIGHT, 'up': INPUT_UP, 'down': INPUT_DOWN}
+
+OUTCOMES = ('win', 'base_destroyed', 'out_of_lives', 'timeout')
+
+
+# Player policies. Each takes the game seed and returns a function that is called once per tick and returns the INPUT_* bitmask to hold.
+# Both always respawn, so a game only ends in a win, a lost home base, no lives left or the tick limit.
+def random_policy(seed: int) -> Callable[[Simulation], int]:
+    # Same player as the benchmark workload: holds a random direction for 20 ticks at a time and shoots half of the time
+    rng = random.Random(seed)
+    mask = 0
+
+    def policy(sim: Simulation) -> int:
+        nonlocal mask
+        if sim.tick % 20 == 0:
+            mask = rng.choice([INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, 0]) | INPUT_RESPAWN
+            if rng.random() < 0.5:
+                mask |= INPUT_SHOOT
+        return mask
+    return policy
+
+
+def hunter_policy(seed: int) -> Callable[[Simulation], int]:
+    # Walks towards the nearest enemy tank and fires once it is lined up with it. Wanders a quarter of the time so it does not stay stuck behind walls.
+    rng = random.Random(seed)
+
+    def policy(sim: Simulation) -> int:
+        player = sim.player_tank
+        if player.hp == 0:
+            return INPUT_RESPAWN
+
+        enemies = [tank for tank in sim.tanks.values() if isinstance(tank, EnemyTank)]
+        if not enemies:
+            return 0
+        target = min(enemies, key=lambda tank: abs(tank.x - player.x) + abs(tank.y - player.y))
+        dx, dy = target.x - player.x, target.y - player.y
+
+        if dx == 0 or dy == 0: # Lined up, turn to face the target then shoot
+            direction = ('right' if dx > 0 else 'left') if dy == 0 else ('down' if dy > 0 else 'up')
+            return INPUT_SHOOT if player.direction == direction else DIRECTION_INPUTS[direction]
+
+        if rng.random() < 0.25:
+            return rng.choice(list(DIRECTION_INPUTS.values())) | INPUT_SHOOT
+        if abs(dx) > abs(dy):
+            direction = 'right' if dx > 0 else 'left'
+        else:
+            direction = 'down' if dy > 0 else 'up'
+        return DIRECTION_INPUTS[direction] | INPUT_SHOOT
+    return policy
+
+
+POLICIES: dict[str, Callable[[int], Callable[[Simulation], int]]] = {'random': random_policy, 'hunter': hunter_policy}
+
+
+# Plays one game until it is won or lost, or until max_ticks ticks have passed
+def play_game(name: str, level: CompiledLevel, seed: int, policy_name: str, hp: int, max_ticks: int) -> dict[str, Any]:
+    sim = Simulation(hp=hp)
+    sim.reset(level, seed)
+    policy = POLICIES[policy_name](seed)
+    while not (sim.is_win or sim.is_gameover) and sim.tick < max_ticks:
+        sim.step(policy(sim))
+
+    if sim.is_win:
+        outcome = 'win'
+    elif sim.base_destroyed:
+        outcome = 'base_destroyed'
+    elif sim.is_gameover:
+        outcome = 'out_of_lives'
+    else:
+        outcome = 'timeout'
+
+    return {
+        'level': name,
+        'seed': seed,
+        'policy': policy_name,
+        'hp': hp,
+        'enemy_ai': level.enemy_ai,
+        'enemy_fire': level.enemy_fire,
+        'max_ticks': max_ticks,
+        'outcome': outcome,
+        'ticks': sim.tick,
+        'time': sim.time, # Game time in frames, the clock powerup_req is measured against
+        'powerup_req': sim.powerup_time_limit,
+        'powerup_got': sim.powerup_got,
+        'lives_left': sim.hp,
+        'enemies_left': sim.rem_tanks,
+    }
+
+
+# Per-worker settings, set once by the pool initializer so each job only sends its level name and seed
+worker_levels: dict[str, CompiledLevel] = {}
+worker_settings: tuple[str, int, int] = ('random', 2, 0)
+
+
+def init_worker(levels: dict[str, dict[str, Any]], policy_name: str, hp: int, max_ticks: int):
+    global worker_levels, worker_settings
+    worker_levels = {name: compile_level(level, name) for name, level in levels.items()} # Compiled once per worker, not once per game
+    worker_settings = (policy_name, hp, max_ticks)
+
+
+def run_job(job: tuple[str, int]) -> dict[str, Any]:
+    name, seed = job
+    return play_game(name, worker_levels[name], seed, *worker_settings)
+
+
+def game_key(record: dict[str, Any]) -> tuple[str, int, str, int, str, str, int | None]:
+    # Results written before max_ticks was recorded have None, so their games are played again rather than trusted
+    return record['level'], record['seed'], record['policy'], record['hp'], record.get('enemy_ai', 'random'), record.get('enemy_fire', 'random'), record.get('max_ticks')
+
+
+def read_results(path: str) -> list[dict[str, Any]]:
+    # Drops a partly written last line left behind by an interrupted sweep so appending starts on a clean line
+    if not os.path.exists(path):
+        return []
+    with open(path, 'rb+') as results_file:
+        data = results_file.read()
+        if data and not data.endswith(b'\n'):
+            results_file.truncate(data.rfind(b'\n') + 1)
+            data = data[:data.rfind(b'\n') + 1]
+    return [json.loads(line) for line in data.splitlines() if line.strip()]
+
+
+def summarize(records: list[dict[str, Any]]) -> dict[tuple[str, str, str, str], dict[str, Any]]:
+    groups: dict[tuple[str, str, str, str], list[dict[str, Any]]] = {}
+    for record in records:
+        groups.setdefault((record['level'], record['policy'], record.get('enemy_ai', 'random'), record.get('enemy_fire', 'random')), []).append(record)
+
+    summary = {}
+    for key, games in sorted(groups.items()):
+        wins = [game for game in games if game['outcome'] == 'win']
+        summary[key] = {
+            'games': len(games),
+            **{f'{outcome}_rate': sum(game['outcome'] == outcome for game in games) / len(games) for outcome in OUTCOMES},
+            'mean_clear_time': sum(game['time'] for game in wins) / len(wins) if wins else None,
+            'powerup_rate': sum(game['powerup_got'] for game in games) / len(games),
+        }
+    return summary
+
+
+def print_summary(records: list[dict[str, Any]]):
+    print(f'{"level":<22}{"policy":<8}{"ai":<8}{"fire":<8}{"games":>7}{"win %":>8}{"clear s":>9}{"base %":>8}{"lives %":>9}{"t/o %":>7}{"powerup %":>11}')
+    for (level, policy, enemy_ai, enemy_fire), row in summarize(records).items():
+        clear = f'{row["mean_clear_time"] / 60:.1f}' if row['mean_clear_time'] is not None else '-'
+        print(f'{level:<22}{policy:<8}{enemy_ai:<8}{enemy_fire:<8}{row["games"]:>7}{row["win_rate"] * 100:>8.1f}{clear:>9}{row["base_destroyed_rate"] * 100:>8.1f}'
+              f'{row["out_of_lives_rate"] * 100:>9.1f}{row["timeout_rate"] * 100:>7.1f}{row["powerup_rate"] * 100:>11.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Play many headless games in parallel and report per-level outcome statistics.')
+    parser.add_argument('levels', nargs='*', help='stage files to play (default: every shipped level)')
+    parser.add_argument('--games', type=int, default=100, help='games per level, one per seed (default: 100)')
+    parser.add_argument('--seed', type=int, default=1, help='first seed, games use seed, seed + 1, ...')
+    parser.add_argument('--policy', choices=sorted(POLICIES), default='hunter')
+    parser.add_argument('--ai', choices=ENEMY_AI_MODES, default=None, help='enemy AI of every level (default: what each stage file says)')
+    parser.add_argument('--fire', choices=ENEMY_FIRE_MODES, default=None, help='when enemy tanks shoot in every level (default: what each stage file says)')
+    parser.add_argument('--hp', type=int, default=2, help='starting lives (default: 2, same as the game)')
+    parser.add_argument('--max-ticks', type=int, default=36000, help='a game not decided after this many ticks is a timeout (default: 36000, ten minutes)')
+    parser.add_argument('--filter', default='', help='only play levels whose name contains this text')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: one per core)')
+    parser.add_argument('--output', default='batch_output.jsonl', help='one JSON line per finished game, appended to so a sweep can be resumed (default: batch_output.jsonl)')
+    parser.add_argument('--summary', action='store_true', help='only print the statistics of the games already in --output')
+    args = parser.parse_args()
+
+    records = read_results(args.output)
+    if args.summary:
+        print_summary(records)
+        return
+
+    if args.levels:
+        levels = {}
+        for path in args.levels:
+            with open(path) as map_file:
+                levels[os.path.splitext(os.path.basename(path))[0]] = json.load(map_file)
+    else:
+        levels = dict(shipped_levels())
+    levels = {name: level for name, level in levels.items() if args.filter in name}
+    if args.ai:
+        levels = {name: {**level, 'enemy_ai': args.ai} for name, level in levels.items()}
+    if args.fire:
+        levels = {name: {**level, 'enemy_fire': args.fire} for name, level in levels.items()}
+
+    # Resume: skip every game the output file already has a result for
+    done = {game_key(record) for record in records}
+    jobs = [(name, seed) for name in levels for seed in range(args.seed, args.seed + args.games) if (name, seed, args.policy, args.hp, levels[name].get('enemy_ai', 'random'), levels[name].get('enemy_fire', 'random'), args.max_ticks) not in done]
+    print(f'{len(jobs)} games to play, {len(levels) * args.games - len(jobs)} already in {args.output}')
+
+    already = len(records)
+    start = time.perf_counter()
+    with open(args.output, 'a') as output_file:
+        def record(result: dict[str, Any]):
+            output_file.write(json.dumps(result) + '\n')
+            output_file.flush()
+            records.append(result)
+            played = len(records) - already
+            if played % 100 == 0 or played == len(jobs):
+                print(f'{played}/{len(jobs)} games, {played / (time.perf_counter() - start):.1f} games/s')
+
+        if args.workers <= 1:
+            init_worker(levels, args.policy, args.hp, args.max_ticks)
+            for job in jobs:
+                record(run_job(job))
+        else:
+            with multiprocessing.Pool(args.workers, init_worker, (levels, args.policy, args.hp, args.max_ticks)) as pool:
+                for result in pool.imap_unordered(run_job, jobs, chunksize=max(1, len(jobs) // (args.workers * 16))):
+                    record(result)
+
+    print_summary(records)
+
+
+if __name__ == '__main__':
+    main()
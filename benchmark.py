@@ -0,0 +1,163 @@
+import argparse
+import copy
+import glob
+import json
+import os
+import platform
+import random
+import time
+import tracemalloc
+from typing import Any
+from levels import CompiledLevel, compile_level
+from simulation import Simulation, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, INPUT_SHOOT, INPUT_RESPAWN
+
+LEVEL_DIR = 'assets/levels'
+
+
+def shipped_levels() -> list[tuple[str, dict[str, Any]]]:
+    paths = sorted(glob.glob(os.path.join(LEVEL_DIR, 'level*.json'))) + sorted(glob.glob(os.path.join(LEVEL_DIR, 'debug_levels', '*.json')))
+    levels = []
+    for path in paths:
+        with open(path) as map_file:
+            levels.append((os.path.splitext(os.path.basename(path))[0], json.load(map_file)))
+    return levels
+
+
+# Stress variants of a shipped level: four times the enemies, a quarter of the empty cells turned into mirrors,
+# the map tiled into a 200 x 200 grid (only the first player spawn is kept) with eight times the enemies,
+# and the tiled map in horde mode, with 500 enemies spawning 100 at a time
+def stress_variants(name: str, level: dict[str, Any], seed: int) -> list[tuple[str, dict[str, Any]]]:
+    enemies = copy.deepcopy(level)
+    enemies['enemy_count'] = level['enemy_count'] * 4
+
+    mirrors = copy.deepcopy(level)
+    rng = random.Random(seed)
+    for row in mirrors['map']:
+        for x, cell in enumerate(row):
+            if cell == 0 and rng.random() < 0.25:
+                row[x] = rng.choice([6, 7])
+
+    large = copy.deepcopy(level)
+    rows = [row * -(-200 // len(row)) for row in level['map']] * -(-200 // len(level['map']))
+    large['map'] = [row[:200] for row in rows[:200]]
+    players = [(x, y) for y, row in enumerate(large['map']) for x, cell in enumerate(row) if cell == 1]
+    for x, y in players[1:]:
+        large['map'][y][x] = 0
+    large['enemy_count'] = level['enemy_count'] * 8
+
+    horde = copy.deepcopy(large)
+    horde['enemy_count'] = 500
+    horde['spawn_wave'] = 100
+
+    return [(f'{name}+enemies', enemies), (f'{name}+mirrors', mirrors), (f'{name}+large', large), (f'{name}+horde', horde)]
+
+
+# Fixed seeded player: holds a random direction for 20 ticks at a time, shoots half of the time and always respawns
+def workload_inputs(seed: int, n_ticks: int) -> bytes:
+    rng = random.Random(seed)
+    inputs = bytearray()
+    mask = 0
+    for tick in range(n_ticks):
+        if tick % 20 == 0:
+            mask = rng.choice([INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, 0]) | INPUT_RESPAWN
+            if rng.random() < 0.5:
+                mask |= INPUT_SHOOT
+        inputs.append(mask)
+    return bytes(inputs)
+
+
+# Plays the workload, restarting the level whenever it ends so every tick simulates live gameplay.
+# Appends per-tick latencies in nanoseconds to latencies if given. Returns the final simulation and the number of restarts.
+def play(level: CompiledLevel | dict[str, Any], seed: int, inputs: bytes, latencies: list[int] | None = None, profile: bool = False) -> tuple[Simulation, int]:
+    sim = Simulation(hp=99) # Enough lives that game overs come from the home base, not the player
+    sim.profiler.enabled = profile
+    sim.profiler.window = len(inputs)
+    sim.reset(level, seed)
+    restarts = 0
+    for mask in inputs:
+        if sim.undraw:
+            restarts += 1
+            sim.reset(level, seed + restarts)
+
+        if latencies is None:
+            sim.step(mask)
+        else:
+            tick_start = time.perf_counter_ns()
+            sim.step(mask)
+            latencies.append(time.perf_counter_ns() - tick_start)
+    return sim, restarts
+
+
+def run_level(level: dict[str, Any], seed: int, n_ticks: int, profile: bool = False) -> dict[str, Any]:
+    inputs = workload_inputs(seed, n_ticks)
+    compiled = compile_level(level) # Restarts only rebuild the game from the compiled level, as in the game
+
+    # Timing pass
+    latencies: list[int] = []
+    start = time.perf_counter()
+    _, restarts = play(compiled, seed, inputs, latencies)
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    # Memory pass, separate because tracemalloc slows down every allocation
+    tracemalloc.start()
+    play(compiled, seed, inputs)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    result = {
+        'ticks': n_ticks,
+        'ticks_per_sec': n_ticks / elapsed,
+        'p50_ms': latencies[len(latencies) // 2] / 1e6,
+        'p99_ms': latencies[min(len(latencies) - 1, (len(latencies) * 99) // 100)] / 1e6,
+        'max_ms': latencies[-1] / 1e6,
+        'peak_memory_kb': peak / 1024,
+        'restarts': restarts,
+    }
+
+    # Per-phase pass, separate because the phase timers add their own overhead
+    if profile:
+        sim, _ = play(compiled, seed, inputs, profile=True)
+        result['phases'] = sim.profiler.summary()
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the headless simulation on every shipped level.')
+    parser.add_argument('--ticks', type=int, default=3600, help='ticks simulated per level (default: 3600, one minute of game time)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--no-stress', action='store_true', help='skip the stress variants')
+    parser.add_argument('--filter', default='', help='only run levels whose name contains this text')
+    parser.add_argument('--profile', action='store_true', help='also record per-phase timings of the tick')
+    parser.add_argument('--output', default='bench_output.json', help='machine-readable results (default: bench_output.json)')
+    args = parser.parse_args()
+
+    levels = shipped_levels()
+    if not args.no_stress:
+        levels += [variant for name, level in levels if name.startswith('level') for variant in stress_variants(name, level, args.seed)]
+    levels = [(name, level) for name, level in levels if args.filter in name]
+
+    results = {}
+    print(f'{"level":<22}{"ticks/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"max ms":>10}{"peak KB":>10}{"restarts":>10}')
+    for name, level in levels:
+        result = run_level(level, args.seed, args.ticks, args.profile)
+        results[name] = result
+        print(f'{name:<22}{result["ticks_per_sec"]:>10.0f}{result["p50_ms"]:>10.3f}{result["p99_ms"]:>10.3f}{result["max_ms"]:>10.3f}{result["peak_memory_kb"]:>10.1f}{result["restarts"]:>10}')
+        for phase, timings in result.get('phases', {}).items():
+            print(f'    {phase:<18}{timings["mean_ms"]:>10.4f}{timings["p50_ms"]:>10.4f}{timings["p99_ms"]:>10.4f}{timings["max_ms"]:>10.3f}')
+
+    with open(args.output, 'w') as output_file:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'seed': args.seed,
+            'ticks': args.ticks,
+            'levels': results,
+        }, output_file, indent=4)
+    print(f'results written to {args.output}')
+
+
+if __name__ == '__main__':
+    main()
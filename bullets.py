@@ -0,0 +1,44 @@
+from __future__ import annotations
+from typing import TYPE_CHECKING, Literal
+
+if TYPE_CHECKING:
+    from simulation import Bullet, Tank
+
+# What a bullet does in its step, decided for every bullet of the batch before any of them moves
+LAND = 0 # Moves into an empty cell of map_database
+OVERLAY = 1 # Moves over water or a fellow enemy tank, into duplicate_map_database
+STOP = 2 # Hits stone, the edge of the map or a mirror cycle
+HIT_BRICK = 3 # Damages a brick or the home base
+HIT_TANK = 4 # Damages a tank
+HIT_BULLET = 5 # Runs into a bullet that is not moving this tick
+
+
+# The bullets moving in one tick as parallel lists, entry i of every list describing the same bullet.
+# Simulation.step_bullets() fills it and runs each phase as one loop over plain lists. One batch is reused every tick.
+class BulletBatch:
+    def __init__(self):
+        self.bullets: list[Bullet] = []
+        self.shooters: list[Tank | Bullet] = [] # The live tank that fired the bullet, or the bullet itself once its tank is dead
+        self.start_x: list[int] = []
+        self.start_y: list[int] = []
+        self.on_grid: list[bool] = [] # False for a bullet fired this tick, which still shares the cell of its tank
+        self.end_x: list[int] = []
+        self.end_y: list[int] = []
+        self.direction: list[Literal['left', 'right', 'up', 'down']] = [] # After the mirrors on the way
+        self.outcome: list[int] = []
+        self.done: list[bool] = [] # Already destroyed by another bullet
+
+    def __len__(self) -> int:
+        return len(self.bullets)
+
+    def clear(self):
+        for column in (self.bullets, self.shooters, self.start_x, self.start_y, self.on_grid, self.end_x, self.end_y, self.direction, self.outcome, self.done):
+            column.clear()
+
+    def add(self, bullet: Bullet, shooter: Tank | Bullet, on_grid: bool):
+        self.bullets.append(bullet)
+        self.shooters.append(shooter)
+        self.start_x.append(bullet.x)
+        self.start_y.append(bullet.y)
+        self.on_grid.append(on_grid)
+        self.done.append(False)
@@ -0,0 +1,175 @@
+import argparse
+import time
+from typing import Any
+from benchmark import shipped_levels
+from grid import BULLET, BRICK, DIRECTION_CODES, ENEMY_TANK, HOME_BASE, PLAYER_ID, PLAYER_TANK, STONE, np
+from levels import CompiledLevel, compile_level
+from simulation import Simulation, HomeBase, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, INPUT_SHOOT, INPUT_RESPAWN
+
+# Discrete actions as the INPUT_* bitmask they hold: nothing, the four directions, shoot, and each direction while shooting.
+# The player always respawns, so an episode only ends in a win, a game over or the tick limit.
+ACTIONS = (0, INPUT_LEFT, INPUT_RIGHT, INPUT_UP, INPUT_DOWN, INPUT_SHOOT,
+           INPUT_LEFT | INPUT_SHOOT, INPUT_RIGHT | INPUT_SHOOT, INPUT_UP | INPUT_SHOOT, INPUT_DOWN | INPUT_SHOOT)
+
+# Observation channels, each a (height, width) int8 layer
+CELL = 0 # Cell type of map_database, see grid.py. Cells past the edge of a smaller map are STONE.
+DIRECTION = 1 # DIRECTION_CODES of the tank or bullet in the cell, 0 for none
+HP = 2 # Of tanks, bricks and the home base
+OVERLAY = 3 # BULLET where duplicate_map_database has a bullet, over water or an enemy tank
+PLAYER = 4 # 1 on the player tank and on the player's bullet
+CHANNELS = 5
+
+# Reward for each change during a step
+REWARD_KILL = 1.0 # Per enemy tank destroyed
+REWARD_LIFE = 1.0 # Per life gained, minus this per life lost
+REWARD_WIN = 5.0
+REWARD_BASE_DESTROYED = -5.0
+
+
+# One game as a Gym-style environment: reset() returns (observation, info), step(action) returns
+# (observation, reward, terminated, truncated, info). The observation array is reused, copy it to keep it past the next step.
+# Bricks and the home base are kept in a terrain array updated from sim.terrain_changes, so a step only writes the tanks and bullets.
+class BattleCityEnv:
+    def __init__(self, level: CompiledLevel | dict[str, Any], ticks_per_step: int = 1, max_ticks: int = 36000, hp: int = 2, out: Any = None):
+        if np is None:
+            raise ImportError('BattleCityEnv requires numpy')
+        self.level = level if isinstance(level, CompiledLevel) else compile_level(level)
+        self.ticks_per_step = ticks_per_step
+        self.max_ticks = max_ticks # A game not decided after this many ticks is truncated
+        self.hp = hp
+        self.sim = Simulation(hp=hp)
+        self.episodes = 0
+        self.seed = 0
+
+        # out is this env's (CHANNELS, height, width) slot of a larger batch, at least as large as the map
+        width, height = self.level.width, self.level.height
+        self.observation = out if out is not None else np.zeros((CHANNELS, height, width), dtype=np.int8)
+        self.observation[:] = 0
+        self.observation[CELL] = STONE
+        self.view = self.observation[:, :height, :width]
+        self.terrain = np.zeros((2, height, width), dtype=np.int8) # Cell type and hp of everything that is not a tank or a bullet
+
+    def reset(self, seed: int | None = None) -> tuple[Any, dict[str, Any]]:
+        self.seed = seed if seed is not None else self.seed + 1
+        self.episodes += 1
+        self.sim.hp = self.hp
+        self.sim.reset(self.level, self.seed)
+        self.terrain[CELL] = self.level.static_layer
+        self.terrain[1] = 0
+        for x, y in self.sim.bricks:
+            self.update_terrain(x, y)
+        self.sim.terrain_changes.clear()
+        self.observe()
+        return self.observation, {'seed': self.seed}
+
+    def step(self, action: int) -> tuple[Any, float, bool, bool, dict[str, Any]]:
+        sim = self.sim
+        rem_tanks, hp = sim.rem_tanks, sim.hp
+        sim.step(ACTIONS[action] | INPUT_RESPAWN, self.ticks_per_step)
+        for x, y in sim.terrain_changes:
+            self.update_terrain(x, y)
+        sim.terrain_changes.clear()
+        self.observe()
+
+        reward = (rem_tanks - sim.rem_tanks) * REWARD_KILL + (sim.hp - hp) * REWARD_LIFE
+        terminated = sim.is_win or sim.is_gameover
+        truncated = not terminated and sim.tick >= self.max_ticks
+        info: dict[str, Any] = {}
+        if terminated:
+            reward += REWARD_WIN if sim.is_win else REWARD_BASE_DESTROYED if sim.base_destroyed else 0.0
+            info['outcome'] = 'win' if sim.is_win else 'base_destroyed' if sim.base_destroyed else 'out_of_lives'
+        elif truncated:
+            info['outcome'] = 'timeout'
+        return self.observation, reward, terminated, truncated, info
+
+    def update_terrain(self, x: int, y: int):
+        brick = self.sim.bricks.get((x, y))
+        self.terrain[CELL, y, x] = 0 if brick is None else HOME_BASE if isinstance(brick, HomeBase) else BRICK
+        self.terrain[1, y, x] = 0 if brick is None else brick.hp
+
+    def observe(self):
+        # Terrain is two array copies, then one write per tank and bullet. No grid cell is looked at.
+        sim, view = self.sim, self.view
+        view[CELL] = self.terrain[CELL]
+        view[HP] = self.terrain[1]
+        view[DIRECTION] = 0
+        view[OVERLAY] = 0
+        view[PLAYER] = 0
+        for tank_id, tank in sim.tanks.items():
+            x, y = tank.x, tank.y
+            view[CELL, y, x] = PLAYER_TANK if tank_id == PLAYER_ID else ENEMY_TANK
+            view[DIRECTION, y, x] = DIRECTION_CODES[tank.direction]
+            view[HP, y, x] = tank.hp
+        for (x, y), bullet in sim.bullets.items():
+            view[CELL, y, x] = BULLET
+            view[DIRECTION, y, x] = DIRECTION_CODES[bullet.direction]
+            if bullet.owner == PLAYER_ID:
+                view[PLAYER, y, x] = 1
+        for (x, y), bullet in sim.duplicate_bullets.items():
+            view[OVERLAY, y, x] = BULLET
+            if bullet.owner == PLAYER_ID:
+                view[PLAYER, y, x] = 1
+        if sim.tanks.get(PLAYER_ID) is sim.player_tank:
+            view[PLAYER, sim.player_tank.y, sim.player_tank.x] = 1
+
+
+# N independent games stepped together in one process. Observations come back stacked as one (N, CHANNELS, height, width) int8 array
+# sized for the largest level, with rewards, terminated and truncated as arrays of N. A game that ends is reset on its next seed
+# within the same step, so the observation of that env is already the first of its next episode.
+class VectorEnv:
+    def __init__(self, levels: list[CompiledLevel | dict[str, Any]], n_envs: int | None = None, ticks_per_step: int = 1, max_ticks: int = 36000, hp: int = 2):
+        if np is None:
+            raise ImportError('VectorEnv requires numpy')
+        compiled = [level if isinstance(level, CompiledLevel) else compile_level(level) for level in levels]
+        self.n_envs = n_envs or len(compiled) # Env i plays levels[i % len(levels)]
+        height = max(level.height for level in compiled)
+        width = max(level.width for level in compiled)
+        self.observations = np.zeros((self.n_envs, CHANNELS, height, width), dtype=np.int8)
+        self.rewards = np.zeros(self.n_envs, dtype=np.float32)
+        self.terminated = np.zeros(self.n_envs, dtype=bool)
+        self.truncated = np.zeros(self.n_envs, dtype=bool)
+        self.envs = [BattleCityEnv(compiled[i % len(compiled)], ticks_per_step, max_ticks, hp, self.observations[i]) for i in range(self.n_envs)]
+
+    def reset(self, seed: int = 0) -> tuple[Any, list[dict[str, Any]]]:
+        # Env i starts on seed + i and moves on by n_envs seeds every episode, so no two envs play the same game
+        infos = [env.reset(seed + i)[1] for i, env in enumerate(self.envs)]
+        return self.observations, infos
+
+    def step(self, actions: Any) -> tuple[Any, Any, Any, Any, list[dict[str, Any]]]:
+        infos: list[dict[str, Any]] = []
+        for i, env in enumerate(self.envs):
+            _, reward, terminated, truncated, info = env.step(int(actions[i]))
+            self.rewards[i] = reward
+            self.terminated[i] = terminated
+            self.truncated[i] = truncated
+            if terminated or truncated:
+                info['episode_ticks'] = env.sim.tick
+                env.reset(env.seed + self.n_envs)
+            infos.append(info)
+        return self.observations, self.rewards, self.terminated, self.truncated, infos
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure environment steps per second with random actions on the shipped levels.')
+    parser.add_argument('--envs', type=int, default=16, help='games stepped together (default: 16)')
+    parser.add_argument('--steps', type=int, default=2000, help='vector steps to run (default: 2000)')
+    parser.add_argument('--ticks-per-step', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    levels: list[CompiledLevel | dict[str, Any]] = [level for name, level in shipped_levels() if name.startswith('level')]
+    vec = VectorEnv(levels, args.envs, args.ticks_per_step)
+    vec.reset(args.seed)
+    rng = np.random.default_rng(args.seed)
+    actions = rng.integers(0, len(ACTIONS), size=(args.steps, args.envs))
+    episodes = 0
+    start = time.perf_counter()
+    for step in range(args.steps):
+        _, _, terminated, truncated, _ = vec.step(actions[step])
+        episodes += int((terminated | truncated).sum())
+    elapsed = time.perf_counter() - start
+    print(f'{args.steps * args.envs} env steps in {elapsed:.2f}s ({args.steps * args.envs / elapsed:.0f} steps/s), {episodes} episodes finished')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,180 @@
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+from abc import ABC, abstractmethod
+from array import array
+from typing import Protocol
+
+# Kinds of gameplay event. Every event is a (tick, kind, tank, source, x, y, value) tuple, -1 where a field does not apply:
+#   LEVEL_START      value is the level number
+#   SHOT             tank fired from (x, y), value is its DIRECTION_CODES direction
+#   BULLET_STOPPED   the bullet of source stopped at (x, y) after hitting something or the edge of the map
+#   BULLETS_COLLIDED the bullets of source and tank destroyed each other
+#   TANK_HIT         tank was hit by the bullet of source, value is the hp it has left
+#   TANK_DESTROYED   tank is gone from (x, y)
+#   BRICK_HIT        a brick or the home base at (x, y) was hit by the bullet of source, value is the hp it has left
+#   BRICK_DESTROYED  the brick at (x, y) is gone
+#   BASE_DESTROYED   the home base at (x, y) is gone and the game is lost
+#   POWERUP          the player earned a life, value is the lives it now has
+#   CHEAT            the cheat code was entered, value is the lives the player now has
+LEVEL_START = 0
+SHOT = 1
+BULLET_STOPPED = 2
+BULLETS_COLLIDED = 3
+TANK_HIT = 4
+TANK_DESTROYED = 5
+BRICK_HIT = 6
+BRICK_DESTROYED = 7
+BASE_DESTROYED = 8
+POWERUP = 9
+CHEAT = 10
+EVENT_NAMES = ('level_start', 'shot', 'bullet_stopped', 'bullets_collided', 'tank_hit', 'tank_destroyed',
+               'brick_hit', 'brick_destroyed', 'base_destroyed', 'powerup', 'cheat')
+
+FIELDS = ('tick', 'kind', 'tank', 'source', 'x', 'y', 'value')
+COLUMN_TYPES = ('I', 'B', 'i', 'i', 'h', 'h', 'i') # array typecodes of FIELDS in the columnar format
+
+# Columnar file layout, little-endian: a sequence of blocks, one per flush. Each is BLOCK followed by every column of FIELDS
+# in turn as a packed array of its COLUMN_TYPES, so a reader can load one column of a block without decoding the others.
+COLUMNAR_MAGIC = b'BCEV'
+COLUMNAR_VERSION = 1
+BLOCK = struct.Struct('<4sBIQ') # magic, version, events in the block, session
+
+FLUSH_SIZE = 4096 # Events a file sink buffers before handing them to its writer thread
+
+Event = tuple[int, int, int, int, int, int, int]
+
+
+class EventSink(Protocol):
+    def write(self, events: list[Event]): ...
+    def close(self): ...
+
+
+# Gameplay events of one Simulation. emit() only appends to a list, and publish() hands the list to every sink once per step,
+# so a tick costs one append per event however many sinks there are. The front end publishes right after each step to play
+# the sounds of that step, and step() publishes anything still pending before its first tick so the list never grows in a headless run.
+class EventBus:
+    def __init__(self):
+        self.pending: list[Event] = []
+        self.sinks: list[EventSink] = []
+
+    def emit(self, tick: int, kind: int, x: int = -1, y: int = -1, tank: int = -1, source: int = -1, value: int = 0):
+        self.pending.append((tick, kind, tank, source, x, y, value))
+
+    def publish(self):
+        if not self.pending:
+            return
+        for sink in self.sinks:
+            sink.write(self.pending)
+        self.pending = [] # A new list, sinks may keep the one they were given
+
+    def close(self):
+        self.publish()
+        for sink in self.sinks:
+            sink.close()
+        self.sinks.clear()
+
+
+# Appends events to a file. write() only extends a buffer; every FLUSH_SIZE events the buffer is handed to a writer thread that
+# encodes it and writes it out, so neither the encoding nor the disk is ever waited on during a frame. close() writes the rest
+# and waits for the thread. session tells apart the games of many players or runs written to one place. Subclasses encode a format.
+class FileSink(ABC):
+    def __init__(self, path: str, session: int = 0, flush_size: int = FLUSH_SIZE):
+        self.path = path
+        self.session = session
+        self.flush_size = flush_size
+        self.buffer: list[Event] = []
+        self.file = open(path, 'ab')
+        self.queue: queue.SimpleQueue[list[Event] | None] = queue.SimpleQueue()
+        self.writer = threading.Thread(target=self.run, daemon=True)
+        self.writer.start()
+
+    def write(self, events: list[Event]):
+        self.buffer.extend(events)
+        if len(self.buffer) >= self.flush_size:
+            self.flush()
+
+    def flush(self):
+        if self.buffer:
+            self.queue.put(self.buffer)
+            self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.queue.put(None)
+        self.writer.join()
+
+    def run(self):
+        while True:
+            events = self.queue.get()
+            if events is None:
+                break
+            self.file.write(self.encode(events))
+            self.file.flush()
+        self.file.close()
+
+    @abstractmethod
+    def encode(self, events: list[Event]) -> bytes:
+        pass
+
+
+# One JSON object per line, with the kind by name
+class JsonlSink(FileSink):
+    def encode(self, events: list[Event]) -> bytes:
+        session = self.session
+        return ''.join(json.dumps({'session': session, 'tick': tick, 'event': EVENT_NAMES[kind], 'tank': tank, 'source': source, 'x': x, 'y': y, 'value': value}) + '\n'
+                       for tick, kind, tank, source, x, y, value in events).encode()
+
+
+# Blocks of packed columns, see BLOCK. About 20 bytes an event and no parsing to read back.
+class ColumnarSink(FileSink):
+    def encode(self, events: list[Event]) -> bytes:
+        parts = [BLOCK.pack(COLUMNAR_MAGIC, COLUMNAR_VERSION, len(events), self.session)]
+        for column, typecode in zip(zip(*events), COLUMN_TYPES):
+            packed = array(typecode, column)
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            parts.append(packed.tobytes())
+        return b''.join(parts)
+
+
+# A .jsonl path gets JSON lines, anything else the columnar format
+def open_sink(path: str, session: int = 0, flush_size: int = FLUSH_SIZE) -> FileSink:
+    sink = JsonlSink if os.path.splitext(path)[1] == '.jsonl' else ColumnarSink
+    return sink(path, session, flush_size)
+
+
+# Every event of a file written by either sink as columns: 'session' and each of FIELDS, entry i of every list describing the same event
+def read_events(path: str) -> dict[str, list[int]]:
+    columns: dict[str, list[int]] = {name: [] for name in ('session',) + FIELDS}
+    if os.path.splitext(path)[1] == '.jsonl':
+        kinds = {name: kind for kind, name in enumerate(EVENT_NAMES)}
+        with open(path) as events_file:
+            for line in events_file:
+                if line.strip():
+                    event = json.loads(line)
+                    event['kind'] = kinds[event['event']]
+                    for name, column in columns.items():
+                        column.append(event[name])
+        return columns
+
+    with open(path, 'rb') as events_file:
+        data = events_file.read()
+    offset = 0
+    while offset < len(data):
+        magic, version, count, session = BLOCK.unpack_from(data, offset)
+        if magic != COLUMNAR_MAGIC or version != COLUMNAR_VERSION:
+            raise ValueError(f'{path}: not an event file of version {COLUMNAR_VERSION} at byte {offset}')
+        offset += BLOCK.size
+        columns['session'].extend([session] * count)
+        for name, typecode in zip(FIELDS, COLUMN_TYPES):
+            column = array(typecode)
+            column.frombytes(data[offset:offset + column.itemsize * count])
+            if sys.byteorder == 'big':
+                column.byteswap()
+            columns[name].extend(column)
+            offset += column.itemsize * count
+    return columns
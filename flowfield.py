@@ -0,0 +1,69 @@
+import heapq
+
+WALL = 0 # Cost of a cell tanks can never drive through
+BRICK_COST = 4 # A brick has to be shot down before a tank can go through, so it counts as a detour of a few cells
+UNREACHABLE = 1 << 30
+
+STEPS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+
+
+# Distance from every cell to the nearest goal cell, shared by all enemy tanks so the cost does not grow with the number of tanks.
+# costs[y][x] is what it costs to drive into a cell. A tank heads for the neighbouring cell with the lowest cost plus distance.
+# Cells only ever get cheaper during a level (bricks are destroyed, never built), which can only shorten distances,
+# so open_cell() repairs the field outwards from the opened cell instead of recomputing all of it.
+class FlowField:
+    def __init__(self, costs: list[list[int]], goals: list[tuple[int, int]]):
+        self.costs = costs
+        self.height = len(costs)
+        self.width = len(costs[0])
+        self.goals = set(goals)
+        self.dist = [[UNREACHABLE] * self.width for _ in range(self.height)]
+        for x, y in goals:
+            self.dist[y][x] = 0
+        self.relax([(0, x, y) for x, y in goals])
+
+    def relax(self, heap: list[tuple[int, int, int]]):
+        # Dijkstra from the cells in heap, whose distances are already set. Only ever lowers distances.
+        heapq.heapify(heap)
+        dist, costs = self.dist, self.costs
+        while heap:
+            d, x, y = heapq.heappop(heap)
+            if d > dist[y][x]:
+                continue
+            enter = costs[y][x] if (x, y) not in self.goals else 1 # From a neighbour into this cell
+            for dx, dy in STEPS:
+                nx, ny = x + dx, y + dy
+                if 0 <= nx < self.width and 0 <= ny < self.height and costs[ny][nx] != WALL and d + enter < dist[ny][nx]:
+                    dist[ny][nx] = d + enter
+                    heapq.heappush(heap, (d + enter, nx, ny))
+
+    def open_cell(self, x: int, y: int, cost: int = 1):
+        # The cell at (x, y) now costs cost to drive into, e.g. a destroyed brick
+        if cost == self.costs[y][x]:
+            return
+        self.costs[y][x] = cost
+        best = self.dist[y][x]
+        for dx, dy in STEPS: # The cell itself may have been a wall with no distance yet
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height and self.dist[ny][nx] < UNREACHABLE:
+                best = min(best, self.dist[ny][nx] + (1 if (nx, ny) in self.goals else self.costs[ny][nx]))
+        self.dist[y][x] = best
+        if best < UNREACHABLE:
+            self.relax([(best, x, y)])
+
+    def best_step(self, x: int, y: int) -> list[tuple[int, int]]:
+        # Steps (dx, dy) from (x, y) towards the nearest goal, several when they tie. Empty if no goal can be reached.
+        if self.dist[y][x] >= UNREACHABLE:
+            return []
+        options: list[tuple[int, tuple[int, int]]] = []
+        for dx, dy in STEPS:
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.width and 0 <= ny < self.height:
+                if (nx, ny) in self.goals:
+                    options.append((0, (dx, dy)))
+                elif self.costs[ny][nx] != WALL and self.dist[ny][nx] < UNREACHABLE:
+                    options.append((self.costs[ny][nx] + self.dist[ny][nx], (dx, dy)))
+        if not options:
+            return []
+        best = min(cost for cost, _ in options)
+        return [step for cost, step in options if cost == best]
@@ -0,0 +1,43 @@
+from typing import Any
+
+# numpy is optional. Without it the game runs on the plain list grids and env.py is unavailable.
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# Cell type codes. 0-9 are the same as the map index values of a stage file.
+EMPTY = 0
+PLAYER_TANK = 1
+ENEMY_TANK = 2
+HOME_BASE = 3
+STONE = 4
+BRICK = 5
+MIRROR_NE = 6
+MIRROR_SE = 7
+WATER = 8
+FOREST = 9
+BULLET = 10
+
+DIRECTION_CODES = {'left': 1, 'right': 2, 'up': 3, 'down': 4}
+
+PLAYER_ID = 0 # Id of the player tank and its bullets. Enemy tanks are numbered from 1.
+
+# Cells of the stage file that never change during a level. Everything else is drawn from the Simulation registries.
+STATIC_CODES = (STONE, MIRROR_NE, MIRROR_SE, WATER)
+
+
+def nonzero_cells(level_map: list[list[int]]) -> list[tuple[int, int, int]]:
+    # (x, y, code) of every non-empty cell of a stage map in row-major order
+    if np is None:
+        return [(x, y, code) for y, row in enumerate(level_map) for x, code in enumerate(row) if code]
+
+    terrain = np.asarray(level_map, dtype=np.int8)
+    ys, xs = np.nonzero(terrain)
+    return list(zip(xs.tolist(), ys.tolist(), terrain[ys, xs].tolist()))
+
+
+def static_layer(level_map: list[list[int]]) -> Any:
+    terrain = np.asarray(level_map, dtype=np.int8)
+    return np.where(np.isin(terrain, STATIC_CODES), terrain, EMPTY).astype(np.int8)
+
@@ -0,0 +1,181 @@
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import time
+from typing import Any
+from grid import EMPTY, PLAYER_TANK, ENEMY_TANK, HOME_BASE, STONE, BRICK, MIRROR_NE, MIRROR_SE, WATER, FOREST
+from levels import LevelError
+
+WIDTH, HEIGHT = 25, 17 # The standard map size, which fits the screen exactly
+MIN_SIZE = 8 # Smallest width and height that leaves room for the spawns, the base fort and some obstacles
+
+# Share of the free cells each kind of obstacle is drawn on, varied by up to half of it per map. Mirrors are drawn as MIRROR_NE or MIRROR_SE.
+DENSITIES = {STONE: 0.07, BRICK: 0.16, WATER: 0.05, FOREST: 0.07, MIRROR_NE: 0.015}
+SEGMENT_LENGTH = (1, 5) # Obstacles are drawn as short horizontal or vertical walls of this many cells
+ENEMY_COUNT = (5, 25)
+MAX_ATTEMPTS = 100 # Maps drawn per seed before giving up on it
+
+# bytes.translate() tables from cell code to 1 or 0. Tanks can get through the PASSABLE cells, bricks included since they
+# can be shot away. Stone, water, mirrors and the home base cannot be crossed.
+PASSABLE = bytes(code in (EMPTY, PLAYER_TANK, ENEMY_TANK, BRICK, FOREST) for code in range(256))
+SPAWNS = bytes(code in (PLAYER_TANK, ENEMY_TANK) for code in range(256))
+BASES = bytes(code == HOME_BASE for code in range(256))
+
+
+# True if every enemy spawn can reach a home base and the player spawn can reach every enemy spawn. Moves go both ways,
+# so one flood fill from the home bases answers both: everything it reaches is connected to everything else it reaches.
+def is_playable(level_map: list[list[int]]) -> bool:
+    # The map as one byte per cell with a column of stone after each row and a row of stone above and below, read as one
+    # big integer. A step of the fill spreads every reached cell to its four neighbours at once with shifts, so it takes
+    # as many steps as the longest path is long instead of one step per cell.
+    stride = len(level_map[0]) + 1
+    cells = bytes([STONE] * stride + [code for row in level_map for code in row + [STONE]] + [STONE] * stride)
+    reached = int.from_bytes(cells.translate(BASES), 'little')
+    if not reached:
+        return False
+    open_cells = int.from_bytes(cells.translate(PASSABLE), 'little') | reached
+    row = 8 * stride
+    while True:
+        grown = (reached | reached << 8 | reached >> 8 | reached << row | reached >> row) & open_cells
+        if grown == reached:
+            break
+        reached = grown
+    spawns = int.from_bytes(cells.translate(SPAWNS), 'little')
+    return spawns & reached == spawns
+
+
+# One random map: the home base in the bottom quarter walled in by bricks with the player spawn beside the fort, one to three
+# blocks of enemy spawns along the top, then walls of stone, brick, water and forest and single mirrors on the free cells.
+# Half of the maps are drawn symmetric left to right, like most of the shipped stages.
+def draw_map(rng: random.Random, width: int, height: int) -> list[list[int]]:
+    level_map = [[EMPTY] * width for _ in range(height)]
+
+    base_x = rng.randint(width // 3, width - width // 3 - 1)
+    base_y = height - 1 - rng.randint(0, height // 4)
+    for y in range(max(0, base_y - 1), min(height, base_y + 2)):
+        for x in range(base_x - 1, base_x + 2):
+            level_map[y][x] = BRICK
+    level_map[base_y][base_x] = HOME_BASE
+    level_map[base_y][base_x + 2] = PLAYER_TANK
+
+    for _ in range(rng.randint(1, 3)):
+        block_width, block_height = rng.randint(1, 3), rng.randint(1, 2)
+        x, y = rng.randint(0, width - block_width), rng.randint(0, height // 4 - block_height)
+        for row in level_map[y:y + block_height]:
+            row[x:x + block_width] = [ENEMY_TANK] * block_width
+
+    random = rng.random
+    symmetric = random() < 0.5
+    free = sum(row.count(EMPTY) for row in level_map)
+    for kind, density in DENSITIES.items():
+        target = int(free * density * rng.uniform(0.5, 1.5))
+        placed = tries = 0
+        while placed < target and tries < target * 4:
+            tries += 1
+            x, y = int(random() * width), int(random() * height) # random() rather than randrange(), which is several times slower
+            dx, dy = (1, 0) if random() < 0.5 else (0, 1)
+            length = 1 if kind == MIRROR_NE else SEGMENT_LENGTH[0] + int(random() * (SEGMENT_LENGTH[1] - SEGMENT_LENGTH[0] + 1))
+            for _ in range(length):
+                if not (0 <= x < width and 0 <= y < height) or level_map[y][x] != EMPTY:
+                    break
+                code = kind if kind != MIRROR_NE else MIRROR_NE if random() < 0.5 else MIRROR_SE
+                level_map[y][x] = code
+                placed += 1
+                if symmetric and level_map[y][width - 1 - x] == EMPTY: # A mirror turns the other way in the reflection
+                    level_map[y][width - 1 - x] = code if code not in (MIRROR_NE, MIRROR_SE) else MIRROR_NE + MIRROR_SE - code
+                    placed += 1
+                x, y = x + dx, y + dy
+    return level_map
+
+
+# A stage file drawn from seed. The same seed and size always give the same level.
+def generate_level(seed: int, number: int = 1, width: int = WIDTH, height: int = HEIGHT) -> dict[str, Any]:
+    if width < MIN_SIZE or height < MIN_SIZE:
+        raise LevelError(f'generated maps must be at least {MIN_SIZE} x {MIN_SIZE} cells, got {width} x {height}')
+    rng = random.Random(seed)
+    for _ in range(MAX_ATTEMPTS):
+        level_map = draw_map(rng, width, height)
+        if is_playable(level_map):
+            break
+    else:
+        raise LevelError(f'seed {seed}: no playable map in {MAX_ATTEMPTS} attempts')
+
+    enemy_count = rng.randint(*ENEMY_COUNT)
+    data = {
+        'level': number,
+        'stage_name': f'Gen {seed}'[:12],
+        'enemy_count': enemy_count,
+        'powerup_req': 300 + 80 * enemy_count, # Roughly what the shipped stages give for their enemy count
+        'tutorial': 0,
+        'map': level_map,
+    }
+    if (width, height) != (WIDTH, HEIGHT):
+        data['width'], data['height'] = width, height
+    return data
+
+
+# Per-worker map size, set once by the pool initializer so each job only sends its level number and seed
+worker_size: tuple[int, int] = (WIDTH, HEIGHT)
+
+
+def init_worker(width: int, height: int):
+    global worker_size
+    worker_size = (width, height)
+
+
+def run_job(job: tuple[int, int]) -> str:
+    # Returns the stage file already serialized, so the parent process only writes it out
+    number, seed = job
+    return json.dumps(generate_level(seed, number, *worker_size), separators=(',', ':'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate random playable stage files in parallel.')
+    parser.add_argument('--count', type=int, default=1000, help='levels to generate, one per seed (default: 1000)')
+    parser.add_argument('--seed', type=int, default=1, help='first seed, levels use seed, seed + 1, ...')
+    parser.add_argument('--width', type=int, default=WIDTH)
+    parser.add_argument('--height', type=int, default=HEIGHT)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (default: one per core)')
+    parser.add_argument('--output', default='levels_output.jsonl', help='one stage file per line, in seed order (default: levels_output.jsonl)')
+    parser.add_argument('--dir', default=None, help='write each level as its own stage file levelNNNNN.json in this directory instead, ready for assets/levels/')
+    args = parser.parse_args()
+
+    jobs = [(number, args.seed + number - 1) for number in range(1, args.count + 1)]
+    if args.dir:
+        os.makedirs(args.dir, exist_ok=True)
+        output_file = None
+    else:
+        output_file = open(args.output, 'w')
+
+    start = time.perf_counter()
+    written = 0
+
+    def write(data: str):
+        nonlocal written
+        written += 1
+        if output_file is not None:
+            output_file.write(data + '\n') # Buffered, the file is flushed as the buffer fills and once at the end
+        else:
+            with open(os.path.join(args.dir, f'level{written:05d}.json'), 'w') as map_file:
+                map_file.write(data)
+        if written % 10000 == 0 or written == len(jobs):
+            print(f'{written}/{len(jobs)} levels, {written / (time.perf_counter() - start):.0f} levels/s')
+
+    try:
+        if args.workers <= 1:
+            init_worker(args.width, args.height)
+            for job in jobs:
+                write(run_job(job))
+        else:
+            with multiprocessing.Pool(args.workers, init_worker, (args.width, args.height)) as pool:
+                for data in pool.imap(run_job, jobs, chunksize=max(1, min(256, len(jobs) // (args.workers * 4)))): # In order, so a pack is the same on every run
+                    write(data)
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+
+if __name__ == '__main__':
+    main()
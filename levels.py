@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Literal, cast
+from flowfield import WALL, BRICK_COST
+from grid import EMPTY, PLAYER_TANK, ENEMY_TANK, HOME_BASE, STONE, BRICK, MIRROR_NE, MIRROR_SE, WATER, FOREST, np, nonzero_cells, static_layer
+
+# Keys every stage file must have, and their types. See "Stage File Contents" in the README.
+LEVEL_KEYS: dict[str, type] = {'level': int, 'stage_name': str, 'enemy_count': int, 'powerup_req': int, 'tutorial': int, 'map': list}
+
+# Values of the optional "enemy_ai" key: random wandering (the default), or heading for the home base or the player
+ENEMY_AI_MODES = ('random', 'base', 'player')
+
+# Values of the optional "enemy_fire" key: a coin flip every time a tank may shoot (the default), or only when its line of fire reaches the player or the home base
+ENEMY_FIRE_MODES = ('random', 'sight')
+
+# Enemy tanks queued by each spawn event when the stage file has no "spawn_wave" key
+SPAWN_WAVE = 1
+
+# Cells that stop a straight line of fire, see SightIndex
+SIGHT_BLOCKERS = (HOME_BASE, STONE, BRICK, MIRROR_NE, MIRROR_SE)
+
+# Cost for an enemy tank to drive into each kind of cell, see FlowField. Every other cell costs 1.
+MOVE_COSTS = {HOME_BASE: WALL, STONE: WALL, MIRROR_NE: WALL, MIRROR_SE: WALL, WATER: WALL, BRICK: BRICK_COST}
+
+
+# Unit step of each direction, and the outgoing direction after a bullet reflects off a mirror
+DIRECTION_STEPS: dict[str, tuple[int, int]] = {'left': (-1, 0), 'right': (1, 0), 'up': (0, -1), 'down': (0, 1)}
+MIRROR_REFLECTIONS: dict[tuple[int, str], Literal['left', 'right', 'up', 'down']] = {
+    (MIRROR_NE, 'left'): 'down', (MIRROR_NE, 'right'): 'up', (MIRROR_NE, 'up'): 'right', (MIRROR_NE, 'down'): 'left',
+    (MIRROR_SE, 'left'): 'up', (MIRROR_SE, 'right'): 'down', (MIRROR_SE, 'up'): 'left', (MIRROR_SE, 'down'): 'right',
+}
+
+
+class LevelError(ValueError):
+    pass
+
+
+# A stage file parsed, validated and preprocessed once. Simulation.reset() builds a game from it without re-reading the file.
+# Nothing in here is changed by a game, so one CompiledLevel is shared by every restart.
+@dataclass
+class CompiledLevel:
+    name: str
+    data: dict[str, Any] # The parsed stage file, kept for replays
+    cells: tuple[tuple[int, int, int], ...] # (x, y, code) of every cell that holds an entity, row-major
+    width: int # In cells
+    height: int
+    spawnpoint: tuple[int, int]
+    enemy_spawns: tuple[tuple[int, int], ...]
+    forest: tuple[tuple[int, int], ...]
+    bricks: tuple[tuple[int, int, int], ...] # (x, y, code) of every brick and home base, the order snapshots store their hp in
+    enemy_ai: str
+    enemy_fire: str
+    spawn_wave: int
+    move_costs: tuple[tuple[int, ...], ...] # Copied by every game, bricks get cheaper as they are destroyed
+    static_layer: Any # Terrain that never changes as a numpy array, None without numpy
+    mirror_table: dict[tuple[int, int, str], tuple[int, int, Literal['left', 'right', 'up', 'down']] | None] = field(repr=False) # See build_mirror_table()
+
+
+def compile_level(data: dict[str, Any], name: str = '') -> CompiledLevel:
+    if not isinstance(data, dict):
+        raise LevelError(f'{name}: a stage file must be a JSON object, got {type(data).__name__}')
+    name = name or str(data.get('stage_name', ''))
+    for key, kind in LEVEL_KEYS.items():
+        if key not in data:
+            raise LevelError(f'{name}: missing "{key}"')
+        if not isinstance(data[key], kind) or isinstance(data[key], bool):
+            raise LevelError(f'{name}: "{key}" must be {kind.__name__}, got {type(data[key]).__name__}')
+
+    level_map = data['map']
+    if not level_map or not all(isinstance(row, list) and len(row) == len(level_map[0]) for row in level_map):
+        raise LevelError(f'{name}: "map" must be a non-empty grid with rows of equal length')
+    for y, row in enumerate(level_map):
+        for x, code in enumerate(row):
+            if not isinstance(code, int) or isinstance(code, bool) or not 0 <= code <= 9:
+                raise LevelError(f'{name}: cell ({x}, {y}) is {code!r}, expected an integer from 0 to 9')
+    height, width = len(level_map), len(level_map[0])
+    for key, size in (('width', width), ('height', height)): # Optional, but must agree with the map when given
+        if key in data and data[key] != size:
+            raise LevelError(f'{name}: "{key}" is {data[key]!r} but the map is {size} cells {"wide" if key == "width" else "high"}')
+
+    enemy_ai = data.get('enemy_ai', 'random')
+    if enemy_ai not in ENEMY_AI_MODES:
+        raise LevelError(f'{name}: "enemy_ai" must be one of {", ".join(ENEMY_AI_MODES)}, got {enemy_ai!r}')
+    enemy_fire = data.get('enemy_fire', 'random')
+    if enemy_fire not in ENEMY_FIRE_MODES:
+        raise LevelError(f'{name}: "enemy_fire" must be one of {", ".join(ENEMY_FIRE_MODES)}, got {enemy_fire!r}')
+    spawn_wave = data.get('spawn_wave', SPAWN_WAVE)
+    if not isinstance(spawn_wave, int) or isinstance(spawn_wave, bool) or spawn_wave < 1:
+        raise LevelError(f'{name}: "spawn_wave" must be a positive integer, got {spawn_wave!r}')
+
+    cells = nonzero_cells(level_map)
+    players = [(x, y) for x, y, code in cells if code == PLAYER_TANK]
+    if len(players) != 1:
+        raise LevelError(f'{name}: expected one player tank spawn, found {len(players)}')
+    enemy_spawns = tuple((x, y) for x, y, code in cells if code == ENEMY_TANK)
+    if data['enemy_count'] > 0 and not enemy_spawns:
+        raise LevelError(f'{name}: "enemy_count" is {data["enemy_count"]} but the map has no enemy tank spawn')
+
+    return CompiledLevel(
+        name=name,
+        data=data,
+        cells=tuple(cell for cell in cells if cell[2] not in (ENEMY_TANK, FOREST)),
+        width=width,
+        height=height,
+        spawnpoint=players[0],
+        enemy_spawns=enemy_spawns,
+        forest=tuple((x, y) for x, y, code in cells if code == FOREST),
+        bricks=tuple(cell for cell in cells if cell[2] in (HOME_BASE, BRICK)),
+        enemy_ai=enemy_ai,
+        enemy_fire=enemy_fire,
+        spawn_wave=spawn_wave,
+        move_costs=tuple(tuple(MOVE_COSTS.get(code, 1) for code in row) for row in level_map),
+        static_layer=static_layer(level_map) if np is not None else None,
+        mirror_table=build_mirror_table(level_map),
+    )
+
+
+# Precomputes, for the static mirror layout of the level, where a bullet entering each mirror from each direction leaves the mirror chain.
+# (mirror_x, mirror_y, incoming direction) -> (new_x, new_y, outgoing direction). Cycles map to None.
+def build_mirror_table(level_map: list[list[int]]) -> dict[tuple[int, int, str], tuple[int, int, Literal['left', 'right', 'up', 'down']] | None]:
+    table: dict[tuple[int, int, str], tuple[int, int, Literal['left', 'right', 'up', 'down']] | None] = {}
+    height, width = len(level_map), len(level_map[0])
+    mirrors = [(x, y, code) for y, row in enumerate(level_map) for x, code in enumerate(row) if code in (MIRROR_NE, MIRROR_SE)]
+
+    for mirror_x, mirror_y, mirror in mirrors:
+        for direction in DIRECTION_STEPS:
+            seen: set[tuple[int, int, str]] = set()
+            x, y, orient, new_direction = mirror_x, mirror_y, mirror, cast(Literal['left', 'right', 'up', 'down'], direction)
+            result = None
+            while (x, y, new_direction) not in seen: # Bounded by 4 visits per mirror, a repeat means the bullet is trapped in a mirror cycle
+                seen.add((x, y, new_direction))
+                new_direction = MIRROR_REFLECTIONS[(orient, new_direction)]
+                dx, dy = DIRECTION_STEPS[new_direction]
+                new_x, new_y = x + dx, y + dy
+                next_mirror = level_map[new_y][new_x] if 0 <= new_x < width and 0 <= new_y < height else EMPTY
+                if next_mirror not in (MIRROR_NE, MIRROR_SE):
+                    result = (new_x, new_y, new_direction)
+                    break
+                x, y, orient = new_x, new_y, next_mirror
+            table[(mirror_x, mirror_y, direction)] = result
+
+    return table
+
+
+# Compiled stage files keyed by path. scan() is the only method that touches the disk: it recompiles a file only when
+# its mtime and then its content hash have changed, so get() during restarts and level changes is a dictionary lookup.
+class LevelCache:
+    def __init__(self):
+        self.entries: dict[str, tuple[int, str, CompiledLevel | LevelError]] = {} # path -> (mtime, sha1 of the file, level or why it is invalid)
+
+    def scan(self, directory: str) -> list[str]:
+        # Returns the stage files of directory in name order, compiling the new and changed ones
+        names = sorted(f for f in os.listdir(directory) if os.path.isfile(os.path.join(directory, f)) and f.endswith('.json'))
+        for name in names:
+            self.refresh(os.path.join(directory, name))
+        return names
+
+    def refresh(self, path: str):
+        mtime = os.stat(path).st_mtime_ns
+        entry = self.entries.get(path)
+        if entry is not None and entry[0] == mtime:
+            return
+
+        with open(path, 'rb') as map_file:
+            raw = map_file.read()
+        digest = hashlib.sha1(raw).hexdigest()
+        if entry is not None and entry[1] == digest: # Touched but not edited
+            self.entries[path] = (mtime, digest, entry[2])
+            return
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        try:
+            level: CompiledLevel | LevelError = compile_level(json.loads(raw), name)
+        except LevelError as error:
+            level = error
+        except ValueError as error: # Invalid JSON or not UTF-8
+            level = LevelError(f'{name}: {error}')
+        self.entries[path] = (mtime, digest, level)
+
+    def get(self, path: str) -> CompiledLevel:
+        # Raises LevelError if the file is invalid
+        if path not in self.entries:
+            self.refresh(path)
+        level = self.entries[path][2]
+        if isinstance(level, LevelError):
+            raise level
+        return level
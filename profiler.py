@@ -0,0 +1,54 @@
+import json
+import time
+from collections import deque
+
+
+# Per-phase frame timer. Call start() at the beginning of a pass and lap(name) after each phase;
+# the time since the previous start/lap is recorded under name. Both are no-ops while disabled.
+class PhaseProfiler:
+    def __init__(self, window: int = 600):
+        self.enabled = False
+        self.window = window # Samples kept per phase for the rolling view, 600 is 10 seconds at 60 fps
+        self.samples: dict[str, deque[float]] = {} # Rolling window of milliseconds per phase
+        self.histograms: dict[str, list[int]] = {} # Whole-session counts per power-of-two bucket of microseconds
+        self.last = 0.0
+
+    def start(self):
+        if self.enabled:
+            self.last = time.perf_counter()
+
+    def lap(self, name: str):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        ms = (now - self.last) * 1000
+        self.last = now
+
+        if name not in self.samples:
+            self.samples[name] = deque(maxlen=self.window)
+            self.histograms[name] = [0] * 32
+        self.samples[name].append(ms)
+        self.histograms[name][min(31, int(ms * 1000).bit_length())] += 1
+
+    def mean(self, name: str) -> float:
+        samples = self.samples.get(name)
+        return sum(samples) / len(samples) if samples else 0.0
+
+    def percentile(self, name: str, fraction: float) -> float:
+        samples = sorted(self.samples.get(name, ()))
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))] if samples else 0.0
+
+    def summary(self) -> dict[str, dict[str, float]]:
+        return {name: {'mean_ms': self.mean(name), 'p50_ms': self.percentile(name, 0.5), 'p99_ms': self.percentile(name, 0.99), 'max_ms': max(samples)} for name, samples in self.samples.items() if samples}
+
+    def export(self, path: str):
+        if not self.samples:
+            return
+        with open(path, 'w') as profile_file:
+            json.dump({
+                'summary': self.summary(),
+                # Bucket i counts samples of [2**(i-1), 2**i) microseconds, bucket 0 is under 1 microsecond
+                'histograms_us': self.histograms,
+                'samples_ms': {name: list(samples) for name, samples in self.samples.items()},
+            }, profile_file)
+        print(f'profile saved! {path}')
@@ -0,0 +1,103 @@
+import argparse
+import json
+import struct
+import time
+import zlib
+from typing import Any
+from simulation import Simulation
+
+# Replay file layout: REPLAY_MAGIC followed by a zlib-compressed body of
+#   header (version, seed, starting hp, tick count, level JSON length), the level JSON,
+#   then the per-tick inputs run-length encoded as (INPUT_* bitmask, run length) pairs.
+REPLAY_MAGIC = b'BCRP'
+REPLAY_VERSION = 3 # Bumped whenever the same inputs play out differently, older replays would desync
+HEADER = struct.Struct('<BQHII')
+RUN = struct.Struct('<BH')
+
+
+class Replay:
+    def __init__(self, level: dict[str, Any], seed: int, hp: int, inputs: bytes):
+        self.level = level
+        self.seed = seed
+        self.hp = hp
+        self.inputs = bytes(inputs) # One INPUT_* bitmask per tick
+
+    @classmethod
+    def from_simulation(cls, sim: Simulation) -> 'Replay':
+        return cls(sim.level_data, sim.seed, sim.start_hp, sim.input_log)
+
+    def runs(self) -> list[tuple[int, int]]:
+        runs: list[tuple[int, int]] = []
+        for mask in self.inputs:
+            if runs and runs[-1][0] == mask and runs[-1][1] < 0xFFFF:
+                runs[-1] = (mask, runs[-1][1] + 1)
+            else:
+                runs.append((mask, 1))
+        return runs
+
+    def to_bytes(self) -> bytes:
+        level = json.dumps(self.level, separators=(',', ':')).encode()
+        body = [HEADER.pack(REPLAY_VERSION, self.seed, self.hp, len(self.inputs), len(level)), level]
+        body += [RUN.pack(mask, length) for mask, length in self.runs()]
+        return REPLAY_MAGIC + zlib.compress(b''.join(body), 9)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Replay':
+        if data[:len(REPLAY_MAGIC)] != REPLAY_MAGIC:
+            raise ValueError('not a battle city replay file')
+        body = zlib.decompress(data[len(REPLAY_MAGIC):])
+        version, seed, hp, n_ticks, level_len = HEADER.unpack_from(body)
+        if version != REPLAY_VERSION:
+            raise ValueError(f'unsupported replay version {version}')
+
+        offset = HEADER.size
+        level = json.loads(body[offset:offset + level_len])
+        offset += level_len
+
+        inputs = bytearray()
+        for mask, length in RUN.iter_unpack(body[offset:]):
+            inputs += bytes([mask]) * length
+        if len(inputs) != n_ticks:
+            raise ValueError(f'replay has {len(inputs)} ticks of input, expected {n_ticks}')
+        return cls(level, seed, hp, inputs)
+
+    def save(self, path: str):
+        with open(path, 'wb') as replay_file:
+            replay_file.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path: str) -> 'Replay':
+        with open(path, 'rb') as replay_file:
+            return cls.from_bytes(replay_file.read())
+
+    # Re-simulates the recording without rendering, as fast as possible. Stops after tick `until` if given (seeking).
+    def play(self, until: int | None = None) -> Simulation:
+        sim = Simulation(hp=self.hp)
+        sim.reset(self.level, self.seed)
+        remaining = len(self.inputs) if until is None else min(until, len(self.inputs))
+        for mask, length in self.runs():
+            if remaining <= 0:
+                break
+            sim.step(mask, min(length, remaining))
+            remaining -= length
+        return sim
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-simulate a battle city replay without rendering.')
+    parser.add_argument('replay', help='path to a .bcr replay file')
+    parser.add_argument('--seek', type=int, default=None, help='stop at this tick instead of the end of the recording')
+    args = parser.parse_args()
+
+    replay = Replay.load(args.replay)
+    start = time.perf_counter()
+    sim = replay.play(args.seek)
+    elapsed = time.perf_counter() - start
+
+    print(f'level {sim.level} ({sim.stage_name}), seed {replay.seed}, {len(replay.inputs)} ticks recorded')
+    print(f'simulated {sim.tick} ticks in {elapsed:.3f}s ({sim.tick / max(elapsed, 1e-9):.0f} ticks/s)')
+    print(json.dumps(sim.state()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+import sys
+import zlib
+from collections import deque
+from savestate import apply_delta, encode_delta
+from simulation import Simulation
+
+KEYFRAME_INTERVAL = 60 # Ticks per keyframe. Each tick in between is a delta against its keyframe, so any tick is one delta away from a full state.
+ENTRY_OVERHEAD = sys.getsizeof(b'') + 8 # Python bytes object header plus the list slot, counted against the budget with the data itself
+
+
+# The last max_ticks ticks of a game as snapshots, for stepping back to any of them. The history is split into groups of one
+# zlib-compressed keyframe followed by the deltas of the next ticks against it, and the oldest groups are dropped to stay
+# within max_ticks and the memory budget. Recording a tick at or before the newest one drops everything after it first,
+# so playing on after a rewind records the new future.
+class RewindBuffer:
+    def __init__(self, max_ticks: int = 3600, budget: int = 4 << 20, keyframe_interval: int = KEYFRAME_INTERVAL):
+        self.max_ticks = max_ticks
+        self.budget = budget # Bytes
+        self.keyframe_interval = keyframe_interval
+        self.groups: deque[tuple[int, bytes, list[bytes]]] = deque() # (tick of the keyframe, compressed keyframe, deltas of the ticks after it)
+        self.keyframe = b'' # The newest keyframe uncompressed, what new deltas are taken against
+        self.size = 0 # Bytes held, see ENTRY_OVERHEAD
+
+    def __len__(self) -> int:
+        return sum(1 + len(deltas) for _, _, deltas in self.groups)
+
+    def clear(self):
+        self.groups.clear()
+        self.keyframe = b''
+        self.size = 0
+
+    def oldest(self) -> int:
+        return self.groups[0][0] if self.groups else -1
+
+    def newest(self) -> int:
+        return self.groups[-1][0] + len(self.groups[-1][2]) if self.groups else -1
+
+    def record(self, sim: Simulation):
+        # Called after every tick, and once after reset() so the start of the level can be rewound to
+        tick = sim.tick
+        if self.groups and tick <= self.newest():
+            self.truncate(tick - 1)
+        snapshot = sim.snapshot()
+        if not self.groups or tick != self.newest() + 1 or len(self.groups[-1][2]) + 1 >= self.keyframe_interval:
+            keyframe = zlib.compress(snapshot, 1)
+            self.groups.append((tick, keyframe, []))
+            self.keyframe = snapshot
+            self.size += len(keyframe) + ENTRY_OVERHEAD
+        else:
+            delta = encode_delta(self.keyframe, snapshot)
+            self.groups[-1][2].append(delta)
+            self.size += len(delta) + ENTRY_OVERHEAD
+
+        while len(self.groups) > 1 and (self.size > self.budget or tick - self.groups[1][0] >= self.max_ticks): # The next group alone still covers max_ticks
+            _, keyframe, deltas = self.groups.popleft()
+            self.size -= len(keyframe) + sum(len(delta) for delta in deltas) + ENTRY_OVERHEAD * (1 + len(deltas))
+
+    def truncate(self, tick: int):
+        # Drops every state after tick
+        while self.groups and self.groups[-1][0] > tick:
+            _, keyframe, deltas = self.groups.pop()
+            self.size -= len(keyframe) + sum(len(delta) for delta in deltas) + ENTRY_OVERHEAD * (1 + len(deltas))
+        if not self.groups:
+            self.keyframe = b''
+            return
+        start, keyframe, deltas = self.groups[-1]
+        dropped = deltas[tick - start:]
+        del deltas[tick - start:]
+        self.size -= sum(len(delta) for delta in dropped) + ENTRY_OVERHEAD * len(dropped)
+        self.keyframe = zlib.decompress(keyframe)
+
+    def get(self, tick: int) -> bytes:
+        # Snapshot of tick, which must be between oldest() and newest()
+        for start, keyframe, deltas in reversed(self.groups): # Rewinds mostly go a little way back
+            if start <= tick:
+                if tick - start > len(deltas):
+                    break
+                base = self.keyframe if keyframe is self.groups[-1][1] else zlib.decompress(keyframe)
+                return base if tick == start else apply_delta(base, deltas[tick - start - 1])
+        raise IndexError(f'tick {tick} is not in the rewind buffer, which holds ticks {self.oldest()} to {self.newest()}')
+
+    def seek(self, sim: Simulation, tick: int):
+        # Puts sim back to tick. The states after it are kept until sim records a tick again, so a debugger can step both ways.
+        sim.restore(self.get(tick))
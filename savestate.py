@@ -0,0 +1,231 @@
+from __future__ import annotations
+import struct
+import zlib
+from array import array
+from typing import TYPE_CHECKING, Literal
+from flowfield import FlowField
+from grid import PLAYER_ID, HOME_BASE
+from levels import MOVE_COSTS
+from scheduler import TimerWheel
+
+if TYPE_CHECKING:
+    from simulation import Simulation, Bullet, Tank
+
+# Snapshot layout, little-endian. The fixed-size sections come first so a delta between two snapshots of one game lines up:
+#   STATE, the RNG state (624 + 1 words, then RNG_TAIL), the hp of every brick of CompiledLevel.bricks (0 once destroyed),
+#   COUNTS, then the tanks (TANK, live tanks in registry order and the dead player tank last if it is not one of them),
+#   the bullets (BULLET), the timers (TIMER) and one byte per queued enemy tank.
+# Only the length of the input log is stored, so a snapshot does not grow with the game. The full log belongs to replays.
+SNAPSHOT_MAGIC = b'BCSS'
+SNAPSHOT_VERSION = 2
+STATE = struct.Struct('<4sBHHIQqqqqqiiiIIIhhB') # magic, version, width, height, bricks, seed, tick, time, frames, frames_before_starting, player_next_move,
+                                                # hp, start_hp, rem_tanks, next_id, concurrent_enem_spawn, bullets left in the pool, flow goal (-1, -1 for none), flags
+RNG_WORDS = 625
+RNG_TAIL = struct.Struct('<?d') # Whether a gauss() value is cached, and that value
+COUNTS = struct.Struct('<IIIII') # tanks in the registry, bullets, timers, queued enemy tanks, input log length
+TANK = struct.Struct('<IHHBbBB') # id, x, y, direction, hp, is_shoot, kind
+BULLET = struct.Struct('<IHHBBB') # owner, x, y, direction, is_shoot, where (OFF_GRID, ON_MAP or ON_DUPLICATE)
+TIMER = struct.Struct('<BIq') # event kind, tank id, tick
+
+# Delta layout: DELTA_MAGIC, DELTA_HEADER, then the zlib-compressed XOR of both snapshots padded to the same length
+DELTA_MAGIC = b'BCSD'
+DELTA_HEADER = struct.Struct('<II') # CRC-32 of the base snapshot, length of the new snapshot
+
+DIRECTIONS: tuple[Literal['left', 'right', 'up', 'down'], ...] = ('left', 'right', 'up', 'down')
+KINDS: tuple[Literal['regular', 'buff'], ...] = ('regular', 'buff')
+EVENT_KINDS = ('spawn', 'move', 'shoot', 'bullet')
+FLAGS = ('is_gameover', 'is_win', 'base_destroyed', 'undraw', 'powerup_can_get', 'powerup_got')
+PLAYER_IN_TANKS = 1 << len(FLAGS)
+OFF_GRID, ON_MAP, ON_DUPLICATE = 0, 1, 2
+
+DIRECTION_CODES = {direction: i for i, direction in enumerate(DIRECTIONS)}
+KIND_CODES = {kind: i for i, kind in enumerate(KINDS)}
+EVENT_CODES = {kind: i for i, kind in enumerate(EVENT_KINDS)}
+
+
+def save_state(sim: Simulation) -> bytes:
+    # Everything a game needs to continue from this tick. Terrain that never changes is left to the level it is restored on.
+    from simulation import EnemyTank
+
+    flags = sum(1 << i for i, name in enumerate(FLAGS) if getattr(sim, name))
+    player_in_tanks = sim.tanks.get(PLAYER_ID) is sim.player_tank
+    if player_in_tanks:
+        flags |= PLAYER_IN_TANKS
+    goal_x, goal_y = sim.flow_goal if sim.flow_goal is not None else (-1, -1)
+    level = sim.compiled
+    _, words, gauss = sim.rng.getstate()
+    parts = [
+        STATE.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, sim.width, sim.height, len(level.bricks), sim.seed, sim.tick, sim.time, sim.frames,
+                   sim.frames_before_starting, sim.player_next_move, sim.hp, sim.start_hp, sim.rem_tanks, sim.next_id, sim.concurrent_enem_spawn,
+                   len(sim.bullet_pool), goal_x, goal_y, flags),
+        array('I', words).tobytes(),
+        RNG_TAIL.pack(gauss is not None, gauss or 0.0),
+    ]
+    bricks = sim.bricks
+    parts.append(bytes(bricks[(x, y)].hp if (x, y) in bricks else 0 for x, y, _ in level.bricks))
+
+    tanks: list[Tank] = list(sim.tanks.values())
+    if not player_in_tanks:
+        tanks.append(sim.player_tank)
+    where: dict[int, int] = {id(bullet): ON_MAP for bullet in sim.bullets.values()}
+    where.update((id(bullet), ON_DUPLICATE) for bullet in sim.duplicate_bullets.values())
+    bullets: dict[int, Bullet] = {id(bullet): bullet for registry in (sim.bullets, sim.duplicate_bullets) for bullet in registry.values()} # In registry order
+    for tank in tanks: # Bullets that are not on the grids are only known to their tanks
+        bullets.setdefault(id(tank.bullet), tank.bullet)
+    pending = sim.timers.pending
+    parts.append(COUNTS.pack(len(sim.tanks), len(bullets), len(pending), len(sim.spawn_queue), len(sim.input_log)))
+
+    parts += [TANK.pack(tank.id if isinstance(tank, EnemyTank) else PLAYER_ID, tank.x, tank.y, DIRECTION_CODES[tank.direction], tank.hp, tank.is_shoot,
+                        KIND_CODES[tank.kind] if isinstance(tank, EnemyTank) else 0) for tank in tanks]
+    parts += [BULLET.pack(bullet.owner, bullet.x, bullet.y, DIRECTION_CODES[bullet.direction], bullet.is_shoot, where.get(key, OFF_GRID)) for key, bullet in bullets.items()]
+    parts += [TIMER.pack(EVENT_CODES[kind], tank_id, tick) for (kind, tank_id), tick in pending.items()]
+    parts.append(bytes(KIND_CODES[kind] for kind in sim.spawn_queue))
+    return b''.join(parts)
+
+
+def load_state(sim: Simulation, data: bytes):
+    # sim must have been reset on the level the snapshot was taken on. Entities are rebuilt, terrain that never changes is kept.
+    from simulation import Bullet, Tank, EnemyTank
+
+    (magic, version, width, height, n_bricks, seed, tick, time, frames, frames_before_starting, player_next_move,
+     hp, start_hp, rem_tanks, next_id, concurrent_enem_spawn, pool_size, goal_x, goal_y, flags) = STATE.unpack_from(data)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('not a battle city snapshot')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError(f'unsupported snapshot version {version}')
+    level = sim.compiled
+    if (width, height, n_bricks) != (level.width, level.height, len(level.bricks)):
+        raise ValueError(f'snapshot of a {width} x {height} map with {n_bricks} bricks does not fit level {level.name}')
+
+    offset = STATE.size
+    words = array('I')
+    words.frombytes(data[offset:offset + RNG_WORDS * 4])
+    offset += RNG_WORDS * 4
+    has_gauss, gauss = RNG_TAIL.unpack_from(data, offset)
+    offset += RNG_TAIL.size
+    sim.rng.setstate((3, tuple(words), gauss if has_gauss else None))
+
+    sim.seed, sim.tick, sim.time, sim.frames = seed, tick, time, frames
+    sim.frames_before_starting, sim.player_next_move = frames_before_starting, player_next_move
+    sim.hp, sim.start_hp, sim.rem_tanks, sim.next_id, sim.concurrent_enem_spawn = hp, start_hp, rem_tanks, next_id, concurrent_enem_spawn
+    for i, name in enumerate(FLAGS):
+        setattr(sim, name, bool(flags & (1 << i)))
+
+    # Tanks and bullets leave the grids, bricks are brought in line with the snapshot
+    grid, duplicate = sim.map_database, sim.duplicate_map_database
+    for tank in sim.tanks.values():
+        if grid[tank.y][tank.x] is tank:
+            grid[tank.y][tank.x] = 0
+    for registry, database in ((sim.bullets, grid), (sim.duplicate_bullets, duplicate)):
+        for x, y in registry:
+            database[y][x] = 0
+        registry.clear()
+    sim.tanks.clear()
+    restore_bricks(sim, data[offset:offset + n_bricks], None if goal_x < 0 else (goal_x, goal_y))
+    offset += n_bricks
+
+    n_tanks, n_bullets, n_timers, n_queued, n_inputs = COUNTS.unpack_from(data, offset)
+    offset += COUNTS.size
+    tank_records = list(TANK.iter_unpack(data[offset:offset + TANK.size * (n_tanks + (not flags & PLAYER_IN_TANKS))]))
+    offset += TANK.size * len(tank_records)
+    bullets: dict[int, Bullet] = {}
+    for owner, x, y, direction, is_shoot, where in BULLET.iter_unpack(data[offset:offset + BULLET.size * n_bullets]):
+        bullet = Bullet(x, y, DIRECTIONS[direction], bool(is_shoot), owner)
+        bullets[owner] = bullet
+        if where == ON_MAP:
+            grid[y][x] = bullet
+            sim.bullets[(x, y)] = bullet
+        elif where == ON_DUPLICATE:
+            duplicate[y][x] = bullet
+            sim.duplicate_bullets[(x, y)] = bullet
+    offset += BULLET.size * n_bullets
+
+    for i, (tank_id, x, y, direction, tank_hp, is_shoot, kind) in enumerate(tank_records):
+        if tank_id == PLAYER_ID:
+            tank: Tank = Tank(x, y, DIRECTIONS[direction], 1, tank_hp, bool(is_shoot), bullets[tank_id])
+            sim.player_tank = tank
+        else:
+            tank = EnemyTank(x, y, DIRECTIONS[direction], 1, tank_hp, bool(is_shoot), bullets[tank_id], tank_id, KINDS[kind])
+        if i < n_tanks:
+            grid[y][x] = tank
+            sim.tanks[tank_id] = tank
+    sim.bullet_pool = [Bullet(0, 0, 'up', False, PLAYER_ID) for _ in range(pool_size)]
+
+    sim.timers = TimerWheel()
+    for kind, tank_id, when in TIMER.iter_unpack(data[offset:offset + TIMER.size * n_timers]):
+        sim.timers.schedule(when, (EVENT_KINDS[kind], tank_id))
+    offset += TIMER.size * n_timers
+    sim.spawn_queue.clear()
+    sim.spawn_queue.extend(KINDS[kind] for kind in data[offset:offset + n_queued])
+    # Going back cuts the live log to the ticks played up to the snapshot. Restoring into a game that has not played that far
+    # yet pads it with empty inputs, so a replay saved afterwards is only right from the snapshot on.
+    del sim.input_log[n_inputs:]
+    sim.input_log.extend(bytes(n_inputs - len(sim.input_log)))
+
+    spawns = sim.dedicated_enem_spawn
+    sim.free_spawns = [i for i, (x, y) in enumerate(spawns) if grid[y][x] == 0]
+    sim.due_events.clear()
+    sim.damaged_bricks.clear()
+    sim.damaged_tanks.clear()
+
+
+def restore_bricks(sim: Simulation, hps: bytes, goal: tuple[int, int] | None):
+    # Destroyed bricks come back and live ones go, keeping the sight index, the move costs and the flow field in step.
+    # Cells only get cheaper during a game, so the flow field is repaired when bricks go and rebuilt when one comes back.
+    from simulation import Brick, HomeBase
+
+    opened: list[tuple[int, int, int]] = []
+    returned = False
+    for (x, y, code), hp in zip(sim.compiled.bricks, hps):
+        brick = sim.bricks.get((x, y))
+        if hp and brick is None:
+            brick = HomeBase(x, y, hp) if code == HOME_BASE else Brick(x, y, hp)
+            sim.map_database[y][x] = brick
+            sim.bricks[(x, y)] = brick
+            sim.sight.add(x, y)
+            sim.move_costs[y][x] = MOVE_COSTS[code]
+            sim.terrain_changes.append((x, y))
+            returned = True
+        elif hp and brick.hp != hp:
+            brick.hp = hp
+            sim.terrain_changes.append((x, y))
+        elif not hp and brick is not None:
+            sim.map_database[y][x] = 0
+            del sim.bricks[(x, y)]
+            sim.sight.remove(x, y)
+            sim.terrain_changes.append((x, y))
+            opened.append((x, y, code))
+
+    if returned: # Back in the order of the level, as reset() added them
+        sim.bricks = {(x, y): sim.bricks[(x, y)] for x, y, _ in sim.compiled.bricks if (x, y) in sim.bricks}
+    rebuild = returned or (sim.enemy_ai == 'player' and goal != sim.flow_goal)
+    for x, y, code in opened:
+        if sim.flow is not None and not rebuild and code != HOME_BASE:
+            sim.flow.open_cell(x, y)
+        else:
+            sim.move_costs[y][x] = 1
+    if rebuild:
+        if sim.enemy_ai == 'base':
+            bases = [(x, y) for x, y, code in sim.compiled.bricks if code == HOME_BASE]
+            sim.flow = FlowField(sim.move_costs, bases) if bases else None
+        elif sim.enemy_ai == 'player':
+            sim.flow = FlowField(sim.move_costs, [goal]) if goal is not None else None
+    sim.flow_goal = goal
+
+
+def encode_delta(base: bytes, snapshot: bytes) -> bytes:
+    # Two snapshots of one game a few ticks apart differ in a few bytes, so their XOR is mostly zeros and compresses to almost nothing
+    size = max(len(base), len(snapshot))
+    diff = int.from_bytes(base, 'little') ^ int.from_bytes(snapshot, 'little')
+    return DELTA_MAGIC + DELTA_HEADER.pack(zlib.crc32(base), len(snapshot)) + zlib.compress(diff.to_bytes(size, 'little'), 1)
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    # The snapshot encode_delta() was given, from the same base
+    if delta[:len(DELTA_MAGIC)] != DELTA_MAGIC:
+        raise ValueError('not a battle city snapshot delta')
+    crc, length = DELTA_HEADER.unpack_from(delta, len(DELTA_MAGIC))
+    if zlib.crc32(base) != crc:
+        raise ValueError('snapshot delta was taken against a different base snapshot')
+    diff = zlib.decompress(delta[len(DELTA_MAGIC) + DELTA_HEADER.size:])
+    return (int.from_bytes(base, 'little') ^ int.from_bytes(diff, 'little')).to_bytes(len(diff), 'little')[:length]
@@ -0,0 +1,37 @@
+from typing import Hashable
+
+
+# Hashed timer wheel. An event is stored in the slot of its tick modulo the wheel size, so scheduling is O(1) and pop() only
+# looks at the events of one slot. Events more than a full turn away stay in their slot until their tick comes around.
+# Rescheduling an event replaces its earlier time: only the latest schedule() of each event fires, the older entries are dropped when their slot is visited.
+class TimerWheel:
+    def __init__(self, size: int = 256):
+        self.size = size # Larger than every interval the game uses, so each event is normally looked at once
+        self.slots: list[list[tuple[int, Hashable]]] = [[] for _ in range(size)]
+        self.pending: dict[Hashable, int] = {} # Tick each event is currently scheduled for
+
+    def schedule(self, tick: int, event: Hashable):
+        if self.pending.get(event) == tick:
+            return
+        self.pending[event] = tick
+        self.slots[tick % self.size].append((tick, event))
+
+    def cancel(self, event: Hashable):
+        self.pending.pop(event, None)
+
+    def pop(self, tick: int) -> list[Hashable]:
+        # The events due at tick in the order they were scheduled. Must be called for every tick in order, skipped ticks lose their events.
+        slot = self.slots[tick % self.size]
+        if not slot:
+            return []
+
+        due: list[Hashable] = []
+        later: list[tuple[int, Hashable]] = []
+        for when, event in slot:
+            if when > tick:
+                later.append((when, event))
+            elif when == tick and self.pending.get(event) == tick:
+                del self.pending[event]
+                due.append(event)
+        self.slots[tick % self.size] = later
+        return due
@@ -0,0 +1,46 @@
+from bisect import bisect_left, bisect_right, insort
+from typing import Iterable, Literal
+
+
+# Cells that stop a straight line of fire (stone, bricks, the home base and mirrors), as a sorted list of x per row and of y per column.
+# next_blocker() is a binary search in one list instead of a walk along the line, and a destroyed brick is removed from two lists.
+# Water, forest and empty cells let bullets through and tanks move, so none of them are in the index.
+class SightIndex:
+    def __init__(self, width: int, height: int, cells: Iterable[tuple[int, int]] = ()):
+        self.width = width
+        self.height = height
+        self.rows: list[list[int]] = [[] for _ in range(height)] # rows[y] holds the x of every blocking cell in row y
+        self.cols: list[list[int]] = [[] for _ in range(width)] # cols[x] holds the y of every blocking cell in column x
+        for x, y in cells:
+            self.add(x, y)
+
+    def add(self, x: int, y: int):
+        insort(self.rows[y], x)
+        insort(self.cols[x], y)
+
+    def remove(self, x: int, y: int):
+        row, col = self.rows[y], self.cols[x]
+        i = bisect_left(row, x)
+        if i < len(row) and row[i] == x:
+            del row[i]
+        i = bisect_left(col, y)
+        if i < len(col) and col[i] == y:
+            del col[i]
+
+    def next_blocker(self, x: int, y: int, direction: Literal['left', 'right', 'up', 'down']) -> tuple[int, int]:
+        # First blocking cell after (x, y) looking in direction, or the first cell past the edge of the map if nothing is in the way
+        if direction == 'right':
+            row = self.rows[y]
+            i = bisect_right(row, x)
+            return (row[i] if i < len(row) else self.width), y
+        if direction == 'left':
+            row = self.rows[y]
+            i = bisect_left(row, x)
+            return (row[i - 1] if i > 0 else -1), y
+        if direction == 'down':
+            col = self.cols[x]
+            i = bisect_right(col, y)
+            return x, (col[i] if i < len(col) else self.height)
+        col = self.cols[x]
+        i = bisect_left(col, y)
+        return x, (col[i - 1] if i > 0 else -1)
@@ -0,0 +1,773 @@
+from bisect import bisect_left, insort
+from collections import deque
+from dataclasses import dataclass
+import random
+from typing import Any, Literal, cast
+from bullets import LAND, OVERLAY, STOP, HIT_BRICK, HIT_TANK, HIT_BULLET, BulletBatch
+from events import LEVEL_START, SHOT, BULLET_STOPPED, BULLETS_COLLIDED, TANK_HIT, TANK_DESTROYED, BRICK_HIT, BRICK_DESTROYED, BASE_DESTROYED, POWERUP, CHEAT, EventBus
+from flowfield import FlowField
+from grid import DIRECTION_CODES, PLAYER_ID
+from levels import DIRECTION_STEPS, SIGHT_BLOCKERS, CompiledLevel, compile_level
+from profiler import PhaseProfiler
+from savestate import load_state, save_state
+from scheduler import TimerWheel
+from sightlines import SightIndex
+
+@dataclass
+class Bullet:
+    x: int
+    y: int
+    direction: Literal['left', 'right', 'up', 'down']
+    is_shoot: bool
+    owner: int # Id of the tank that fired it, PLAYER_ID for the player
+
+@dataclass
+class Tank:
+    x: int
+    y: int
+    direction: Literal['left', 'right', 'up', 'down']
+    speed: int
+    hp: int
+    is_shoot: bool
+    bullet: Bullet
+
+@dataclass
+class EnemyTank(Tank):
+    id: int # Numbered from 1 in spawn order, never reused within a game
+    kind: Literal['regular', 'buff']
+
+@dataclass
+class Stone:
+    x: int
+    y: int
+
+@dataclass
+class Brick(Stone):
+    hp: int
+
+@dataclass
+class Mirror:
+    x: int
+    y: int
+    orientation: Literal['NE', 'SE']
+
+@dataclass
+class Water:
+    x: int
+    y: int
+
+@dataclass
+class Forest:
+    pass
+
+@dataclass
+class HomeBase(Brick):
+    pass
+# Input bits for Simulation.step(), one bit per key the player can hold during a tick
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_UP = 4
+INPUT_DOWN = 8
+INPUT_SHOOT = 16
+INPUT_RESPAWN = 32
+INPUT_CHEAT = 64 # Entered cheat code, one more life
+INPUT_DESTRUCT = 128 # Debug key, destroys the player tank
+
+# What a bullet does to the cell it moves into, by the type of what is in that cell. Empty cells are LAND.
+# Enemy bullets pass over fellow enemy tanks, a player bullet hits them instead.
+BULLET_OUTCOMES: dict[type, int] = {Stone: STOP, Mirror: STOP, Brick: HIT_BRICK, HomeBase: HIT_BRICK, Tank: HIT_TANK, EnemyTank: OVERLAY, Water: OVERLAY, Bullet: HIT_BULLET}
+
+# Direction of each unit step, the reverse of DIRECTION_STEPS
+STEP_DIRECTIONS: dict[tuple[int, int], Literal['left', 'right', 'up', 'down']] = {(-1, 0): 'left', (1, 0): 'right', (0, -1): 'up', (0, 1): 'down'}
+
+# Timing in ticks. Enemy tanks draw a fresh interval from their range every time they move or consider shooting.
+SPAWN_INTERVAL = 180 # A wave of enemy tanks is queued every 3 seconds
+PLAYER_MOVE_INTERVAL = 4
+BULLET_STEP_INTERVAL = 5 # Enemy bullets all step together on multiples of this
+ENEMY_MOVE_INTERVAL = (50, 100)
+ENEMY_SHOOT_INTERVAL = (30, 50)
+
+# Headless game logic. Has no pyxel dependency, so it can be stepped without a window as fast as the CPU allows.
+# The pyxel front end in main.py feeds it inputs, plays the sounds of its events and draws its state.
+class Simulation:
+    def __init__(self, hp: int = 2):
+        self.hp = hp
+        self.tick = 0 # Replaces pyxel.frame_count, advanced once per simulated tick
+        self.inputs = 0
+        self.input_log = bytearray() # One INPUT_* bitmask per tick since the last reset, for replays
+        self.events = EventBus() # Shots, hits, deaths and the like, see events.py
+        self.profiler = PhaseProfiler() # Disabled until someone turns it on
+
+    def reset(self, level: CompiledLevel | dict[str, Any], seed: int | None = None):
+        # level is a compiled stage file, or its parsed contents which are compiled here. The same level, seed, starting hp and inputs always replay the same game.
+        if not isinstance(level, CompiledLevel):
+            level = compile_level(level)
+        self.compiled = level
+        self.level_data = level.data
+        self.seed = seed if seed is not None else random.randrange(2**32)
+        self.rng = random.Random(self.seed)
+        self.start_hp = self.hp
+        self.tick = 0
+        self.input_log.clear()
+        self.events.publish() # The end of the previous game goes out before this one starts
+
+        self.level = self.level_data["level"]
+        self.stage_name = self.level_data["stage_name"]
+        self.events.emit(self.tick, LEVEL_START, value=self.level)
+        self.powerup_time_limit = self.level_data["powerup_req"]
+        self.is_gameover = False
+        self.is_win = False
+        self.base_destroyed = False # Tells a game over from the home base apart from one from running out of lives
+        self.undraw = False
+        self.powerup_can_get = True
+        self.powerup_got = False
+        self.time = 0
+        self.frames = 0
+        self.frames_before_starting = self.tick + 200
+
+        # Timed events are (kind, tank id) pairs: ('spawn', 0), ('move', id), ('shoot', id) and ('bullet', id).
+        # Each tick update() takes the events that are due from the wheel, so tanks with nothing due cost nothing.
+        self.timers = TimerWheel()
+        self.timers.schedule(self.tick, ('spawn', 0))
+        self.due_events: set[tuple[str, int]] = set()
+        self.player_next_move = self.tick # The player can move again from this tick on
+
+        self.width, self.height = level.width, level.height # In cells, set by the stage file
+        self.map_database: list[list[Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int]] = [[0 for _ in range(self.width)] for _ in range(self.height)]
+
+        # Scans the map file and updates parameters
+        self.num_tanks: int = self.level_data["enemy_count"]
+        self.rem_tanks = self.num_tanks # This has to be updated every time a new tank spawns in too
+
+        self.spawnpoint: tuple[int,int] = level.spawnpoint
+        
+        # Enemy tank spawning. Each spawn event queues spawn_wave tanks, which take the free spawn points as they become available.
+        self.next_id = PLAYER_ID + 1
+        self.concurrent_enem_spawn: int = 0 # Tanks spawned so far, queued ones not included
+        self.spawn_wave = level.spawn_wave
+        self.spawn_queue: deque[Literal['regular', 'buff']] = deque()
+        self.dedicated_enem_spawn: list[tuple[int, int]] = list(level.enemy_spawns)
+        self.spawn_index: dict[tuple[int, int], int] = {pos: i for i, pos in enumerate(self.dedicated_enem_spawn)}
+        self.free_spawns: list[int] = list(range(len(self.dedicated_enem_spawn))) # Sorted indices into dedicated_enem_spawn of the spawn points with nothing on them, kept up to date by set_cell()
+
+        self.duplicate_map_database: list[list[Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int]] = [[0 for _ in range(self.width)] for _ in range(self.height)] # Overwriting objects with bullets
+        self.forest_draw: list[tuple[int, int]] = list(level.forest) # Overwriting purposes
+
+        # Entity registries, kept in sync with the grids so per-tick work scales with the number of entities instead of the map area
+        self.tanks: dict[int, Tank | EnemyTank] = {} # Live tanks keyed by id (PLAYER_ID for the player tank)
+        self.bullets: dict[tuple[int, int], Bullet] = {} # In-flight bullets in map_database keyed by cell
+        self.duplicate_bullets: dict[tuple[int, int], Bullet] = {} # In-flight bullets in duplicate_map_database keyed by cell
+        self.bricks: dict[tuple[int, int], Brick] = {} # Damageable bricks and the home base keyed by cell
+        self.terrain_changes: list[tuple[int, int]] = [] # Cells of bricks that were damaged or removed, emptied by the front end once redrawn
+        self.damaged_bricks: list[tuple[int, int]] = [] # Cells of bricks hit since eliminate_no_hp_entity() last ran
+        self.damaged_tanks: list[int] = [] # Ids of tanks hit since eliminate_no_hp_entity() last ran
+
+        self.bullet_batch = BulletBatch() # Reused by step_bullets() every tick
+
+
+        # Every tank owns one persistent Bullet that is moved in place, so the pool holds one per enemy the level can spawn plus the player's
+        self.bullet_pool: list[Bullet] = [Bullet(0, 0, 'up', False, PLAYER_ID) for _ in range(self.num_tanks + 1)]
+
+        self.generate_level()
+
+        # Goal-directed enemy AI, see FlowField. 'random' keeps the original wandering.
+        self.enemy_ai = level.enemy_ai
+        self.move_costs = [list(row) for row in level.move_costs]
+        self.flow: FlowField | None = None
+        self.flow_goal: tuple[int, int] | None = None
+        if self.enemy_ai == 'base':
+            bases = [pos for pos, brick in self.bricks.items() if isinstance(brick, HomeBase)]
+            if bases:
+                self.flow = FlowField(self.move_costs, bases)
+
+        self.mirror_table = level.mirror_table # Mirrors never move, so the table is built once when the level is compiled
+
+        # 'sight' tanks only shoot when line_of_fire() reaches a target, 'random' ones on a coin flip
+        self.enemy_fire = level.enemy_fire
+        self.sight = SightIndex(self.width, self.height, ((x, y) for x, y, code in level.cells if code in SIGHT_BLOCKERS))
+
+    def step(self, inputs: int = 0, n_ticks: int = 1):
+        # inputs is a bitmask of INPUT_* flags, held for all n_ticks
+        self.events.publish()
+        self.inputs = inputs
+        for _ in range(n_ticks):
+            self.input_log.append(inputs)
+            self.update()
+            self.tick += 1
+
+    def state(self) -> dict[str, Any]:
+        bullets = [(entity.x, entity.y, entity.direction, entity.owner) for registry in (self.bullets, self.duplicate_bullets) for entity in registry.values()]
+        enemies = [(entity.x, entity.y, entity.direction, entity.hp, entity.id) for entity in self.tanks.values() if isinstance(entity, EnemyTank)]
+        return {
+            'tick': self.tick,
+            'time': self.time,
+            'hp': self.hp,
+            'rem_tanks': self.rem_tanks,
+            'is_gameover': self.is_gameover,
+            'is_win': self.is_win,
+            'undraw': self.undraw,
+            'powerup_got': self.powerup_got,
+            'player': (self.player_tank.x, self.player_tank.y, self.player_tank.direction, self.player_tank.hp),
+            'enemies': enemies,
+            'bullets': bullets,
+        }
+
+    # Compact binary copy of the whole game state, see savestate.py. restore() continues the game from it, on the level it was taken on.
+    def snapshot(self) -> bytes:
+        return save_state(self)
+
+    def restore(self, data: bytes):
+        load_state(self, data)
+
+    def acquire_bullet(self, x: int, y: int, direction: Literal['left', 'right', 'up', 'down'], owner: int) -> Bullet:
+        bullet = self.bullet_pool.pop()
+        bullet.x, bullet.y, bullet.direction, bullet.is_shoot, bullet.owner = x, y, direction, False, owner
+        return bullet
+
+# ------- Generator Functions -------
+    # Main priority in generation is to ensure that the tanks and stones do not overlap each other
+    def generate_level(self):
+        for x, y, code in self.compiled.cells: # Only the cells that hold an entity, spawns and forest are precomputed by the level
+            if code == 1:
+                self.player_tank = Tank(x, y, 'right', 1, 1, False, self.acquire_bullet(0, 0, 'right', PLAYER_ID))
+                self.map_database[y][x] = self.player_tank
+                self.tanks[PLAYER_ID] = self.player_tank
+            elif code == 3:
+                homebase = HomeBase(x, y, 1)
+                self.map_database[y][x] = homebase
+                self.bricks[(x, y)] = homebase
+            elif code == 4:
+                self.map_database[y][x] = Stone(x, y)
+            elif code == 5:
+                brick = Brick(x, y, 2)
+                self.map_database[y][x] = brick
+                self.bricks[(x, y)] = brick
+            elif code == 6:
+                self.map_database[y][x] = Mirror(x, y, 'NE')
+            elif code == 7:
+                self.map_database[y][x] = Mirror(x, y, 'SE')
+            elif code == 8:
+                self.map_database[y][x] = Water(x, y)
+
+    # ------- End of Generator Functions -------
+
+    # Queues the tanks of one spawn wave, never more than the level has left to spawn
+    def queue_enem_tanks(self):
+        for _ in range(min(self.spawn_wave, self.num_tanks - self.concurrent_enem_spawn - len(self.spawn_queue))):
+            self.spawn_queue.append(cast(Literal['regular', 'buff'], self.rng.choice(['regular', 'regular', 'buff'])))
+
+    # Places queued tanks on random free spawn points until either runs out. Tanks left in the queue wait for a spawn point to clear.
+    def generate_enem_tank(self):
+        while self.spawn_queue and not self.no_valid_spawn_points():
+            x_i, y_i = self.dedicated_enem_spawn[self.free_spawns[self.rng.randint(0, len(self.free_spawns) - 1)]]
+            kind = self.spawn_queue.popleft()
+            enem_tank = EnemyTank(x_i, y_i, 'up', 1, 1 if kind == 'regular' else 2, False, self.acquire_bullet(x_i, y_i, 'up', self.next_id), self.next_id, kind)
+            self.set_cell(self.map_database, x_i, y_i, enem_tank)
+            self.tanks[enem_tank.id] = enem_tank
+            self.schedule_enemy_tank(enem_tank.id)
+            self.next_id += 1
+            self.concurrent_enem_spawn += 1
+
+# ------- Helper Functions -------
+    # First move and first shot of a newly spawned enemy tank. Shots are only considered once the countdown is over.
+    def schedule_enemy_tank(self, tank_id: int):
+        self.timers.schedule(self.tick + self.rng.randint(*ENEMY_MOVE_INTERVAL), ('move', tank_id))
+        self.timers.schedule(max(self.tick, self.frames_before_starting) + self.rng.randint(*ENEMY_SHOOT_INTERVAL), ('shoot', tank_id))
+
+    # Next step of the bullet fired by tank_id, on the shared enemy bullet cadence. A step due this very tick is added to the events being processed.
+    def schedule_bullet_step(self, tank_id: int, after: int = 0):
+        tick = -(-(self.tick + after) // BULLET_STEP_INTERVAL) * BULLET_STEP_INTERVAL
+        if tick == self.tick:
+            self.due_events.add(('bullet', tank_id))
+        else:
+            self.timers.schedule(tick, ('bullet', tank_id))
+
+    def bullets_of(self, database: list[list[Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int]]) -> dict[tuple[int, int], Bullet]:
+        return self.bullets if database is self.map_database else self.duplicate_bullets
+
+    # Every grid write that can place or remove a bullet or a tank goes through here so the bullet registries and free spawn points stay in sync
+    def set_cell(self, database: list[list[Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int]], x: int, y: int, value: Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int):
+        bullets = self.bullets_of(database)
+        if isinstance(database[y][x], Bullet):
+            del bullets[(x, y)]
+        if isinstance(value, Bullet):
+            bullets[(x, y)] = value
+        database[y][x] = value
+
+        spawn = self.spawn_index.get((x, y)) if database is self.map_database else None
+        if spawn is not None:
+            free = self.free_spawns
+            i = bisect_left(free, spawn)
+            if value == 0 and (i == len(free) or free[i] != spawn):
+                insort(free, spawn)
+            elif value != 0 and i < len(free) and free[i] == spawn:
+                del free[i]
+
+    # Check entities with hp values, remove them if hp == 0
+    def eliminate_tank(self, tank_id: int, entity: Tank | EnemyTank):
+        self.set_cell(self.map_database, entity.x, entity.y, 0)
+        del self.tanks[tank_id]
+        self.timers.cancel(('move', tank_id))
+        self.timers.cancel(('shoot', tank_id)) # A bullet still in flight keeps its steps
+        self.events.emit(self.tick, TANK_DESTROYED, entity.x, entity.y, tank_id)
+
+        if type(entity) == Tank and entity.hp == 0:
+            self.hp -= 1
+            if self.hp == 0:
+                self.is_gameover = True
+                self.frames = self.tick + 180
+        else:
+            self.rem_tanks -= 1
+
+    def eliminate_no_hp_entity(self):
+        for tank_id in self.damaged_tanks: # Only tanks hit this tick can have run out of hp
+            entity = self.tanks.get(tank_id)
+            if entity is not None and entity.hp <= 0:
+                self.eliminate_tank(tank_id, entity)
+        self.damaged_tanks.clear()
+
+        for pos in self.damaged_bricks: # Only bricks hit this tick can have run out of hp, the rest of the map is never looked at
+            entity = self.bricks.get(pos)
+            if entity is not None and entity.hp <= 0:
+                self.map_database[entity.y][entity.x] = 0
+                del self.bricks[pos]
+                self.terrain_changes.append(pos)
+                self.sight.remove(entity.x, entity.y)
+                if self.flow is not None:
+                    self.flow.open_cell(entity.x, entity.y) # Repairs the distances around the new gap, and updates move_costs shared with the field
+                else:
+                    self.move_costs[entity.y][entity.x] = 1
+                if isinstance(entity, (HomeBase)):
+                    self.is_gameover = True
+                    self.base_destroyed = True
+                    self.frames = self.tick + 180
+
+                self.events.emit(self.tick, BASE_DESTROYED if isinstance(entity, HomeBase) else BRICK_DESTROYED, entity.x, entity.y)
+        self.damaged_bricks.clear()
+
+    def tank_id_of(self, entity: Tank | EnemyTank) -> int:
+        return entity.id if isinstance(entity, EnemyTank) else PLAYER_ID
+
+    def check_rem_tanks(self):
+        if self.rem_tanks == 0 and not self.is_win:
+            self.is_win = True
+            self.frames = self.tick + 180
+
+    # Moves the bullets due this tick: the player's every tick, the enemies' on their bullet steps
+    def step_bullets(self):
+        due: list[tuple[Bullet, Tank | EnemyTank | Bullet]] = []
+        stepped: list[tuple[int, Bullet]] = [] # Enemy bullets that had a step due, rescheduled at the end while they fly
+        owners = [tank_id for kind, tank_id in self.due_events if kind == 'bullet']
+        flying: dict[int, Bullet] = {} # Bullets of dead tanks are found by owner, only needed when one may be due
+        if owners or PLAYER_ID not in self.tanks:
+            flying = {bullet.owner: bullet for registry in (self.bullets, self.duplicate_bullets) for bullet in registry.values()}
+
+        if self.player_tank.is_shoot and self.player_tank.bullet.is_shoot:
+            due.append((self.player_tank.bullet, self.player_tank))
+        elif PLAYER_ID not in self.tanks and PLAYER_ID in flying and flying[PLAYER_ID].is_shoot: # From a dead player tank
+            due.append((flying[PLAYER_ID], flying[PLAYER_ID]))
+
+        for tank_id in owners:
+            tank = self.tanks.get(tank_id)
+            if isinstance(tank, EnemyTank):
+                if tank.is_shoot and tank.bullet.is_shoot:
+                    due.append((tank.bullet, tank))
+                stepped.append((tank_id, tank.bullet))
+            elif tank_id in flying and flying[tank_id].is_shoot: # Keeps moving after its tank died
+                due.append((flying[tank_id], flying[tank_id]))
+                stepped.append((tank_id, flying[tank_id]))
+
+        if due:
+            self.move_bullet_batch(due)
+        for tank_id, bullet in stepped:
+            if bullet.is_shoot: # Still flying, keeps stepping even if its tank dies
+                self.schedule_bullet_step(tank_id, 1)
+
+    # Moves the bullets as one batch, in passes over the batch lists: work out where each bullet ends up and what it hits,
+    # sweep the bullets against each other, then apply the outcomes. All of them leave their cells at once, so two bullets swapping cells
+    # or meeting in one cell collide instead of passing through each other, and a bullet following another one is never stopped by it.
+    def move_bullet_batch(self, due: list[tuple[Bullet, Tank | EnemyTank | Bullet]]):
+        batch = self.bullet_batch
+        batch.clear()
+        if len(due) > 1:
+            due.sort(key=lambda item: (item[0].y, item[0].x, item[0].owner)) # Row-major, as the grids used to be scanned
+        for bullet, shooter in due:
+            if self.bullets.get((bullet.x, bullet.y)) is bullet:
+                batch.add(bullet, shooter, True)
+                self.set_cell(self.map_database, bullet.x, bullet.y, 0) # Every moving bullet leaves the grids before any of them lands, so the cells they leave count as empty
+            elif self.duplicate_bullets.get((bullet.x, bullet.y)) is bullet:
+                batch.add(bullet, shooter, True)
+                self.set_cell(self.duplicate_map_database, bullet.x, bullet.y, 0)
+            else: # Fired this tick from its tank's cell, fire_bullet() already took it off the grids
+                batch.add(bullet, shooter, False)
+
+        # --- Where each bullet ends up, through the mirrors on the way, and what it finds there ---
+        grid, width, height = self.map_database, self.width, self.height
+        for bullet in batch.bullets:
+            direction = bullet.direction
+            dx, dy = DIRECTION_STEPS[direction]
+            x, y = bullet.x + dx, bullet.y + dy
+            outcome = LAND
+            if 0 <= x < width and 0 <= y < height and type(grid[y][x]) == Mirror:
+                reflection = self.mirror_table[(x, y, direction)]
+                if reflection is None: # Trapped in a mirror cycle
+                    outcome = STOP
+                else:
+                    x, y, direction = reflection
+
+            if outcome == STOP or not (0 <= x < width and 0 <= y < height):
+                outcome = STOP
+            else:
+                outcome = BULLET_OUTCOMES.get(type(grid[y][x]), LAND)
+                if outcome == OVERLAY and bullet.owner == PLAYER_ID and type(grid[y][x]) == EnemyTank:
+                    outcome = HIT_TANK
+            batch.end_x.append(x)
+            batch.end_y.append(y)
+            batch.direction.append(direction)
+            batch.outcome.append(outcome)
+
+        # --- Sweep the bullets against each other: swapped cells, a shared landing cell, or a bullet standing in the way ---
+        starts = {(batch.start_x[i], batch.start_y[i]): i for i in range(len(batch)) if batch.on_grid[i]} if len(batch) > 1 else {}
+        landings: dict[tuple[int, int], int] = {}
+        for i, bullet in enumerate(batch.bullets):
+            if batch.done[i]:
+                continue
+            end = (batch.end_x[i], batch.end_y[i])
+            j = starts.get(end)
+            if j is not None and j != i and not batch.done[j] and batch.on_grid[i] and (batch.end_x[j], batch.end_y[j]) == (batch.start_x[i], batch.start_y[i]):
+                self.handle_bullet_to_bullet_collision(bullet, batch.bullets[j]) # Head-on, each moving into the cell the other leaves
+                batch.done[i] = batch.done[j] = True
+                continue
+
+            standing = self.bullets.get(end) if batch.outcome[i] == HIT_BULLET else self.duplicate_bullets.get(end) if batch.outcome[i] == OVERLAY else None
+            if standing is not None: # A bullet that is not moving this tick
+                self.handle_bullet_to_bullet_collision(bullet, standing)
+                self.set_cell(self.map_database if batch.outcome[i] == HIT_BULLET else self.duplicate_map_database, end[0], end[1], 0)
+                batch.done[i] = True
+                continue
+            if batch.outcome[i] == HIT_BULLET: # It was destroyed by an earlier bullet of this batch
+                batch.outcome[i] = LAND
+
+            if batch.outcome[i] in (LAND, OVERLAY):
+                k = landings.pop(end, None)
+                if k is not None and not batch.done[k]: # Two bullets meeting in one cell
+                    self.handle_bullet_to_bullet_collision(bullet, batch.bullets[k])
+                    batch.done[i] = batch.done[k] = True
+                else:
+                    landings[end] = i
+
+        # --- Apply what is left ---
+        for i, bullet in enumerate(batch.bullets):
+            if batch.done[i]:
+                continue
+            x, y, outcome = batch.end_x[i], batch.end_y[i], batch.outcome[i]
+            if outcome == LAND or outcome == OVERLAY:
+                bullet.x, bullet.y, bullet.direction = x, y, batch.direction[i]
+                self.set_cell(self.map_database if outcome == LAND else self.duplicate_map_database, x, y, bullet)
+                continue
+
+            target = self.map_database[y][x] if outcome != STOP else None
+            if outcome == HIT_TANK and isinstance(target, Tank):
+                target.hp -= 1
+                self.damaged_tanks.append(self.tank_id_of(target))
+                self.events.emit(self.tick, TANK_HIT, x, y, self.damaged_tanks[-1], bullet.owner, target.hp)
+                if type(target) == Tank:
+                    self.update_player_tank()
+            elif outcome == HIT_BRICK and isinstance(target, Brick):
+                target.hp -= 1
+                self.terrain_changes.append((x, y))
+                self.damaged_bricks.append((x, y))
+                self.events.emit(self.tick, BRICK_HIT, x, y, source=bullet.owner, value=target.hp)
+            self.stop_bullet(bullet, batch.shooters[i])
+
+    # A tank can fire again before its last bullet is gone, so the pooled bullet is taken off the grids first if it is still on them
+    def fire_bullet(self, tank: Tank | EnemyTank):
+        bullet = tank.bullet
+        for database in (self.map_database, self.duplicate_map_database):
+            if self.bullets_of(database).get((bullet.x, bullet.y)) is bullet:
+                self.set_cell(database, bullet.x, bullet.y, 0)
+        self.events.emit(self.tick, SHOT, tank.x, tank.y, bullet.owner, value=DIRECTION_CODES[tank.direction])
+        bullet.x, bullet.y, bullet.direction = tank.x, tank.y, tank.direction
+        tank.is_shoot = True
+        bullet.is_shoot = True
+
+    # A bullet that hit something is gone and its tank, if still alive, may fire again
+    def stop_bullet(self, bullet: Bullet, shooter: Tank | EnemyTank | Bullet):
+        self.events.emit(self.tick, BULLET_STOPPED, bullet.x, bullet.y, source=bullet.owner)
+        bullet.is_shoot = False
+        if shooter is not bullet:
+            shooter.is_shoot = False
+
+    def stop_shooting_if_bullet_collided_with_each_other(self, bullet1: Bullet, bullet2: Bullet):
+        for tank_id in {bullet1.owner, bullet2.owner}:
+            tank = self.tanks.get(tank_id)
+            if type(tank) == EnemyTank:
+                tank.bullet.is_shoot = False
+                tank.is_shoot = False
+
+    def get_new_points(self, x: int, y: int, direction: Literal['left', 'right', 'up', 'down']) -> tuple[int, int]:
+        dx, dy = DIRECTION_STEPS[direction]
+        return x + dx, y + dy
+
+    def change_direction_of_entity(self, direction: Literal['left', 'right', 'up', 'down'], entity_move: Tank | EnemyTank | Bullet):
+        entity_move.direction = direction
+
+    def handle_collision(self, direction: Literal['left', 'right', 'up', 'down'], entity: Literal['player', 'enemy'], curr_x: int, curr_y: int, is_from: Tank | EnemyTank):
+        entity_move = self.map_database[curr_y][curr_x]
+
+        if entity == 'player' and isinstance(entity_move, Tank):
+            self.change_direction_of_entity(direction, entity_move)
+
+        elif entity == 'enemy' and isinstance(entity_move, EnemyTank):
+            self.change_direction_of_entity(direction, entity_move)
+
+    # Both bullets are destroyed. The caller takes them off the grids.
+    def handle_bullet_to_bullet_collision(self, bullet1: Bullet, bullet2: Bullet):
+        self.events.emit(self.tick, BULLETS_COLLIDED, bullet1.x, bullet1.y, bullet2.owner, bullet1.owner)
+        bullet1.is_shoot = False
+        bullet2.is_shoot = False
+
+        if bullet1.owner == PLAYER_ID or bullet2.owner == PLAYER_ID: # I think this should handle the case when a both are from player, but that is quite absurd since the player can only shoot one bullet at a time
+            # Note: Same logic as when a bullet hits a stone
+
+            # Stop player from shooting again first
+            self.player_tank.bullet.is_shoot = False
+            self.player_tank.is_shoot = False
+
+        # Stop enemy tanks from shooting again first
+        self.stop_shooting_if_bullet_collided_with_each_other(bullet1, bullet2)
+
+    def update_player_tank(self):
+        # I forgot the player tank has its own global variable.
+        # These new lines of code is to update the status for self.player_tank
+        # The bullet itself is left alone: if it is in flight it keeps moving as a bullet from a dead tank
+
+        self.player_tank.is_shoot = False
+
+    def move_tanks(self, direction: Literal['left', 'right', 'up', 'down'], entity: Literal['player', 'enemy'], curr_x: int, curr_y: int, new_x: int, new_y: int):
+        # If the new point is safe to move into, move the entity to the new point
+        if self.map_database[new_y][new_x] == 0: 
+            self.set_cell(self.map_database, new_x, new_y, self.map_database[curr_y][curr_x])
+            entity_move = self.map_database[new_y][new_x]
+
+            self.set_cell(self.map_database, curr_x, curr_y, 0)
+
+            if entity == 'player' or entity == 'enemy':
+                if isinstance(entity_move, (Tank, EnemyTank)):
+                    entity_move.x, entity_move.y, entity_move.direction = new_x, new_y, direction
+
+    def is_in_bounds(self, new_x: int, new_y: int) -> bool:
+        return not (0 <= new_x < self.width) or not (0 <= new_y < self.height)
+    
+    def no_valid_spawn_points(self) -> bool: #if there are no valid spawn points, return true.
+        return not self.free_spawns
+            
+# ------- Helper Functions -------
+
+# ------- Main collision checker + Entity movement function -------
+    # Tanks only, bullets are moved by step_bullets()
+    def movement(self, direction: Literal['left', 'right', 'up', 'down'], entity: Literal['player', 'enemy'], curr_x: int, curr_y: int, is_from: Tank | EnemyTank):
+        new_x, new_y = self.get_new_points(curr_x, curr_y, direction)
+
+        # --- Bounds checking ---
+        if self.is_in_bounds(new_x, new_y):
+            self.handle_collision(direction, entity, curr_x, curr_y, is_from)
+        # --- End of Bounds checking ---
+
+
+        # --- Check if there is an entity ahead of the entity trying to move. If there is one, do not move, only turn to face it ---
+        elif isinstance(self.map_database[new_y][new_x], (Stone, Mirror, EnemyTank, Tank, Water)): # Brick and HomeBase inherit from Stone
+            self.handle_collision(direction, entity, curr_x, curr_y, is_from)
+
+        elif isinstance(self.map_database[new_y][new_x], Bullet): # A tank cannot drive into a bullet, nor turn towards it
+            pass
+        # --- End of Check if there is an entity ahead of the entity trying to move. If there is one, do not move --- 
+
+
+        # --- If there is no entity ahead, you can safely move ---
+        else:
+            self.move_tanks(direction, entity, curr_x, curr_y, new_x, new_y)
+        # --- End of If there is no entity ahead, you can safely move ---
+# -- Main collision checker + Entity movement function --
+
+    def player_bullet_still_in_game(self, database: list[list[Stone | Brick | Tank | EnemyTank | Bullet | Mirror | Water | Forest | int]]) -> bool:
+        return any(bullet.owner == PLAYER_ID for bullet in self.bullets_of(database).values())
+
+    # Once per tick, the field towards the player follows the player to its current cell
+    def update_flow_field(self):
+        if self.enemy_ai == 'player' and self.tanks.get(PLAYER_ID) is self.player_tank:
+            goal = (self.player_tank.x, self.player_tank.y)
+            if goal != self.flow_goal:
+                self.flow = FlowField(self.move_costs, [goal])
+                self.flow_goal = goal
+
+    def choose_direction(self, entity: EnemyTank) -> Literal['left', 'right', 'up', 'down']:
+        steps = self.flow.best_step(entity.x, entity.y) if self.flow is not None else []
+        if not steps: # Wandering, or no way to the goal
+            return cast(Literal['left', 'right', 'up', 'down'], ['left', 'right', 'up', 'down'][self.rng.randint(0, 3)])
+        step = steps[0] if len(steps) == 1 else steps[self.rng.randint(0, len(steps) - 1)]
+        return STEP_DIRECTIONS[step]
+
+    # Goal-directed tanks always fire at a brick, the home base or the player right in front of them
+    def aims_at_target(self, entity: EnemyTank) -> bool:
+        if self.enemy_ai == 'random':
+            return False
+        x, y = self.get_new_points(entity.x, entity.y, entity.direction)
+        if self.is_in_bounds(x, y):
+            return False
+        ahead = self.map_database[y][x]
+        return isinstance(ahead, Brick) or ahead is self.player_tank
+
+    # What a bullet fired from (x, y) towards direction hits first: 'player', 'base', or None for a wall, a brick or the edge of the map.
+    # Each straight stretch is one lookup in the sight index, and mirrors are followed through the mirror table.
+    def line_of_fire(self, x: int, y: int, direction: Literal['left', 'right', 'up', 'down']) -> str | None:
+        player = self.player_tank if self.tanks.get(PLAYER_ID) is self.player_tank else None
+        for _ in range(len(self.mirror_table) + 1): # A path cannot enter the same mirror from the same side twice
+            end_x, end_y = self.sight.next_blocker(x, y, direction)
+            if player is not None and ((player.x == x and min(y, end_y) < player.y < max(y, end_y)) or (player.y == y and min(x, end_x) < player.x < max(x, end_x))):
+                return 'player'
+            if isinstance(self.bricks.get((end_x, end_y)), HomeBase):
+                return 'base'
+
+            reflection = self.mirror_table.get((end_x, end_y, direction)) # None for stone, bricks, the edge and trapped bullets
+            if reflection is None:
+                return None
+            exit_x, exit_y, direction = reflection
+            step_x, step_y = DIRECTION_STEPS[direction]
+            x, y = exit_x - step_x, exit_y - step_y # The last mirror of the chain, so the cell the bullet leaves it to is checked too
+        return None
+
+    def ai_tanks_moves(self):
+        due_tanks: list[EnemyTank] = [] # Only the tanks with something due this tick, looked up by id
+        for tank_id in {tank_id for kind, tank_id in self.due_events if kind == 'move' or kind == 'shoot'}: # Bullets are stepped together by step_bullets()
+            tank = self.tanks.get(tank_id)
+            if isinstance(tank, EnemyTank):
+                due_tanks.append(tank)
+        if due_tanks:
+            self.update_flow_field()
+        for entity in sorted(due_tanks, key=lambda tank: (tank.y, tank.x)): # Same row-major order as a grid scan, each tank moves once per tick
+            if ('move', entity.id) in self.due_events:
+                entity.direction = self.choose_direction(entity)
+                self.movement(entity.direction, 'enemy', entity.x, entity.y, entity)   
+                self.timers.schedule(self.tick + self.rng.randint(*ENEMY_MOVE_INTERVAL), ('move', entity.id))
+
+            if ('shoot', entity.id) in self.due_events: # Never scheduled before the countdown is over
+                if self.enemy_fire == 'sight':
+                    should_shoot = self.line_of_fire(entity.x, entity.y, entity.direction) is not None or self.aims_at_target(entity)
+                else:
+                    should_shoot = self.rng.choice([True, False]) or self.aims_at_target(entity)
+                if should_shoot and not entity.is_shoot:
+                    self.fire_bullet(entity)
+                    self.schedule_bullet_step(entity.id)
+                self.timers.schedule(self.tick + self.rng.randint(*ENEMY_SHOOT_INTERVAL), ('shoot', entity.id))
+
+
+    def powerup(self):
+        if self.rem_tanks == self.num_tanks//2 and self.time < self.powerup_time_limit and not self.powerup_got:
+            self.hp += 1
+            self.powerup_got = True
+            self.events.emit(self.tick, POWERUP, self.player_tank.x, self.player_tank.y, PLAYER_ID, value=self.hp)
+
+    def player_input_main(self):
+        # --------- Cheat Code and Debug Keys ---------
+        if self.inputs & INPUT_CHEAT:
+            self.hp += 1
+            self.events.emit(self.tick, CHEAT, self.player_tank.x, self.player_tank.y, PLAYER_ID, value=self.hp)
+        if self.inputs & INPUT_DESTRUCT and self.tanks.get(PLAYER_ID) is self.player_tank and self.player_tank.hp != 0:
+            self.player_tank.hp = 0
+            self.damaged_tanks.append(PLAYER_ID) # Eliminated with the tanks hit this tick
+
+        # --------- Main Player Movement ---------
+        if self.tanks.get(PLAYER_ID) is self.player_tank: # A dead tank cannot move, its old cell may now hold another entity
+            # Held keys are read every tick, so instead of a timer the player has the tick it may move again
+            direction: Literal['left', 'right', 'up', 'down'] | None = None
+            if self.inputs & INPUT_LEFT:
+                direction = 'left'
+            elif self.inputs & INPUT_RIGHT:
+                direction = 'right'
+            elif self.inputs & INPUT_UP:
+                direction = 'up'
+            elif self.inputs & INPUT_DOWN:
+                direction = 'down'
+
+            if direction is not None and self.tick >= self.player_next_move:
+                self.movement(direction, 'player', self.player_tank.x, self.player_tank.y, self.player_tank)
+                self.player_next_move = self.tick + PLAYER_MOVE_INTERVAL
+
+        # --------- Shooting Bullets ---------
+        if self.inputs & INPUT_SHOOT and not self.player_tank.is_shoot and self.tick > self.frames_before_starting and self.player_tank.hp != 0: #  # Uncomment this later. This prevents the player from shooting before the game starts
+            self.fire_bullet(self.player_tank)
+
+        # --------- Respawn Player Tank ---------
+        if self.player_tank.hp == 0 and self.inputs & INPUT_RESPAWN and not self.is_gameover:
+            if self.tanks.get(PLAYER_ID) is self.player_tank: # The old tank died this tick and has not been eliminated yet
+                self.eliminate_tank(PLAYER_ID, self.player_tank)
+
+            # Work around: If previous player bullet still exists in the game, the new self.player_tank should acquire this bullet
+            # Otherwise, we should just create a new bullet for the new_tank
+
+            # The player's pooled bullet is reused either way
+            bullet = self.player_tank.bullet
+            if self.player_bullet_still_in_game(self.map_database) or self.player_bullet_still_in_game(self.duplicate_map_database):
+                self.player_tank = Tank(self.spawnpoint[0], self.spawnpoint[1], 'right', 1, 1, True, bullet)
+            else:
+                bullet.x, bullet.y, bullet.direction, bullet.is_shoot = 0, 0, 'right', False
+                self.player_tank = Tank(self.spawnpoint[0], self.spawnpoint[1], 'right', 1, 1, False, bullet)
+
+
+            # Spawn the tank at the spawnpoint
+            spawned_on = self.map_database[self.spawnpoint[1]][self.spawnpoint[0]]
+            if type(spawned_on) == EnemyTank: # Cases wherein the spawnpoint has an enemy tank
+                self.eliminate_tank(spawned_on.id, spawned_on)
+                self.set_cell(self.map_database, self.spawnpoint[0], self.spawnpoint[1], self.player_tank)
+                self.set_cell(self.duplicate_map_database, self.spawnpoint[0], self.spawnpoint[1], 0)
+            elif type(spawned_on) == Bullet: # Cases wherein the spawnpoint has a bullet
+                self.player_tank.hp -= 1
+                self.damaged_tanks.append(PLAYER_ID)
+                self.events.emit(self.tick, TANK_HIT, spawned_on.x, spawned_on.y, PLAYER_ID, spawned_on.owner, self.player_tank.hp)
+                self.set_cell(self.map_database, self.spawnpoint[0], self.spawnpoint[1], self.player_tank)
+                self.set_cell(self.duplicate_map_database, self.spawnpoint[0], self.spawnpoint[1], 0)
+            else:
+                self.set_cell(self.map_database, self.spawnpoint[0], self.spawnpoint[1], self.player_tank)
+                self.set_cell(self.duplicate_map_database, self.spawnpoint[0], self.spawnpoint[1], 0)
+            self.tanks[PLAYER_ID] = self.player_tank
+
+    def update(self):
+        profiler = self.profiler
+        profiler.start()
+
+        self.due_events.clear()
+        self.due_events.update(self.timers.pop(self.tick))
+
+        if ('spawn', 0) in self.due_events: # A wave of enemy tanks is queued in an interval of 3 seconds
+            self.queue_enem_tanks()
+            if self.concurrent_enem_spawn + len(self.spawn_queue) < self.num_tanks:
+                self.timers.schedule(self.tick + SPAWN_INTERVAL, ('spawn', 0))
+        if self.spawn_queue:
+            self.generate_enem_tank()
+        profiler.lap('spawn')
+
+        if self.is_gameover or self.is_win:
+            if self.tick > self.frames:
+                self.undraw = True
+
+        if not self.undraw:
+            self.time += 1
+
+            self.player_input_main()
+            profiler.lap('input_main')
+
+            self.ai_tanks_moves()
+            profiler.lap('ai')
+
+            self.step_bullets()
+            profiler.lap('bullets')
+
+            self.eliminate_no_hp_entity()
+            profiler.lap('eliminate')
+            
+            self.check_rem_tanks()
+            profiler.lap('rem_tanks')
+
+            self.powerup()
+            profiler.lap('powerup')
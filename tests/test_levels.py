@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+from levels import LevelCache, LevelError
+
+
+# Stage files that are not a valid level are reported by LevelCache and skipped, never raised out of scan()
+class LevelCacheInvalidFileTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name: str, raw: bytes) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'wb') as map_file:
+            map_file.write(raw)
+        return path
+
+    def assert_skipped(self, name: str, raw: bytes):
+        path = self.write(name, raw)
+        cache = LevelCache()
+        self.assertEqual(cache.scan(self.directory.name), [name])
+        with self.assertRaises(LevelError):
+            cache.get(path)
+
+    def test_json_that_is_not_an_object(self):
+        for raw in (b'5', b'null', b'[]', b'"level"'):
+            with self.subTest(raw=raw):
+                self.assert_skipped('level01.json', raw)
+
+    def test_file_that_is_not_utf8(self):
+        self.assert_skipped('level01.json', b'{"level": 1, "stage_name": "\xff\xfe"}')
+
+
+if __name__ == '__main__':
+    unittest.main()